@@ -0,0 +1,393 @@
+"""
+Long-running audit service.
+
+Keeps RcmAuditor instances, the FAISS indexes and the LLM/embedding clients warm across requests.
+RCM CSV uploads and single controls are queued as jobs in a persistent SQLite queue, processed
+concurrently, and per-row results are streamed back (NDJSON) as they complete.
+
+Run:
+    python src/audit_service.py [--host 127.0.0.1] [--port 8080]
+
+Endpoints:
+    GET  /health                       Service status, loaded engagements, cache stats
+    POST /jobs/control                 JSON {"row": {...}, "engagement_id": "..."} -> {"job_id": ...}
+    POST /jobs/rcm?engagement=<id>     Raw RCM CSV body (';'-separated) -> {"job_id": ...}
+    GET  /jobs/<job_id>                Job status and progress
+    GET  /jobs/<job_id>/results        NDJSON stream of per-row results until the job finishes
+
+Set `llm_settings.provider: "fake"` in config.yaml to exercise the service offline (indexes are
+built once under the `__fake` namespace from the local PDFs).
+"""
+import argparse
+import json
+import math
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from config import CONFIG, PROJECT_ROOT
+from index_manager import get_index_manager, validate_engagement_id, DEFAULT_ENGAGEMENT
+from rcm_engine import RcmAuditor
+from run_audit import read_rcm_csv
+from results_store import ResultsStore
+
+FINISHED_STATUSES = ("completed", "failed")
+
+
+def to_jsonable(value):
+    """Recursively replaces NaN/inf (pandas empty cells) with None so results are strict JSON."""
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return None
+    if hasattr(value, 'item'): # numpy scalars
+        return to_jsonable(value.item())
+    return value
+
+
+class JobStore:
+    """SQLite-backed job queue. Jobs survive restarts; interrupted jobs are re-queued on startup."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    engagement_id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    total_rows INTEGER NOT NULL,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS results (
+                    job_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    row_index INTEGER NOT NULL,
+                    result TEXT NOT NULL,
+                    PRIMARY KEY (job_id, seq)
+                );
+            """)
+
+    def create_job(self, kind, engagement_id, rows):
+        job_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, kind, engagement_id, payload, status, total_rows, created_at) VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, engagement_id, json.dumps(to_jsonable(rows), ensure_ascii=False), len(rows), time.time()),
+            )
+        return job_id
+
+    def claim_next(self, kind):
+        """Atomically moves the oldest queued job of `kind` to 'running' and returns it (or None)."""
+        with self._lock, self._conn:
+            job = self._conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND kind = ? ORDER BY created_at LIMIT 1", (kind,)
+            ).fetchone()
+            if job is None:
+                return None
+            self._conn.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE job_id = ?", (time.time(), job['job_id']))
+            return dict(job)
+
+    def requeue_interrupted(self):
+        """Jobs left 'running' by a previous process are restarted from scratch."""
+        with self._lock, self._conn:
+            interrupted = [r['job_id'] for r in self._conn.execute("SELECT job_id FROM jobs WHERE status = 'running'")]
+            for job_id in interrupted:
+                self._conn.execute("DELETE FROM results WHERE job_id = ?", (job_id,))
+                self._conn.execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE job_id = ?", (job_id,))
+        return interrupted
+
+    def add_result(self, job_id, row_index, result):
+        with self._lock, self._conn:
+            seq = self._conn.execute("SELECT COUNT(*) FROM results WHERE job_id = ?", (job_id,)).fetchone()[0]
+            self._conn.execute(
+                "INSERT INTO results (job_id, seq, row_index, result) VALUES (?, ?, ?, ?)",
+                (job_id, seq, row_index, json.dumps(to_jsonable(result), ensure_ascii=False)),
+            )
+
+    def finish(self, job_id, status, error=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE job_id = ?",
+                (status, error, time.time(), job_id),
+            )
+
+    def get_job(self, job_id):
+        with self._lock:
+            job = self._conn.execute(
+                "SELECT job_id, kind, engagement_id, status, total_rows, error, created_at, started_at, finished_at FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+            if job is None:
+                return None
+            job = dict(job)
+            job['completed_rows'] = self._conn.execute("SELECT COUNT(*) FROM results WHERE job_id = ?", (job_id,)).fetchone()[0]
+        return job
+
+    def get_results(self, job_id, after_seq=-1):
+        """Returns [(seq, row_index, result_dict)] with seq > after_seq, in completion order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, row_index, result FROM results WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after_seq),
+            ).fetchall()
+        return [(r['seq'], r['row_index'], json.loads(r['result'])) for r in rows]
+
+
+class AuditService:
+    """
+    Warm auditors + background workers draining the JobStore.
+
+    Bulk RCM jobs and single-control jobs have separate workers: RCM jobs run one at a time with
+    `max_workers` rows in parallel, while `control_workers` threads serve single controls, so an
+    interactive check never waits behind a bulk upload.
+    """
+
+    def __init__(self, job_store, max_workers=4, control_workers=2, poll_interval=0.5, index_manager=None):
+        self.job_store = job_store
+        self.max_workers = max_workers
+        self.control_workers = control_workers
+        self.poll_interval = poll_interval
+        self.index_manager = index_manager or get_index_manager()
+        self._auditors = {}
+        self._auditors_lock = threading.Lock()
+        self._init_locks = {} # engagement_id -> Lock held while its auditor warms up
+        self._stop = threading.Event()
+        self._workers = []
+
+    def get_auditor(self, engagement_id):
+        """
+        One warm RcmAuditor per engagement; all share the process-wide IndexManager.
+        Indexes are loaded outside `_auditors_lock` (under a per-engagement lock), so warming up a
+        new engagement doesn't delay jobs of engagements that are already warm.
+        """
+        engagement_id = engagement_id or DEFAULT_ENGAGEMENT
+        with self._auditors_lock:
+            if engagement_id in self._auditors:
+                return self._auditors[engagement_id]
+            init_lock = self._init_locks.setdefault(engagement_id, threading.Lock())
+
+        with init_lock:
+            with self._auditors_lock:
+                if engagement_id in self._auditors: # warmed up by another worker meanwhile
+                    return self._auditors[engagement_id]
+            auditor = RcmAuditor(engagement_id=engagement_id, index_manager=self.index_manager)
+            auditor.initialize_rag()
+            auditor.rag_engine.ingest_regulations()
+            with self._auditors_lock:
+                self._auditors[engagement_id] = auditor
+            return auditor
+
+    def submit_control(self, row, engagement_id=None):
+        engagement_id = validate_engagement_id(engagement_id)
+        return self.job_store.create_job('control', engagement_id, [row])
+
+    def submit_rcm(self, csv_bytes, engagement_id=None):
+        engagement_id = validate_engagement_id(engagement_id)
+        df = read_rcm_csv(csv_bytes)
+        rows = [row.to_dict() for _, row in df.iterrows()]
+        return self.job_store.create_job('rcm', engagement_id, rows)
+
+    def start(self):
+        interrupted = self.job_store.requeue_interrupted()
+        if interrupted:
+            print(f"Re-queued {len(interrupted)} interrupted job(s).")
+        self._workers = [threading.Thread(target=self._run, args=('rcm',), name="audit-worker-rcm", daemon=True)]
+        self._workers += [
+            threading.Thread(target=self._run, args=('control',), name=f"audit-worker-control-{i}", daemon=True)
+            for i in range(self.control_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def stop(self):
+        self._stop.set()
+        for worker in self._workers:
+            worker.join()
+
+    def _run(self, kind):
+        while not self._stop.is_set():
+            job = self.job_store.claim_next(kind)
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self._process_job(job)
+
+    def _process_job(self, job):
+        job_id = job['job_id']
+        rows = json.loads(job['payload'])
+        print(f"Processing job {job_id} ({job['kind']}, {len(rows)} rows, engagement '{job['engagement_id']}')...")
+        try:
+            auditor = self.get_auditor(job['engagement_id'])
+        except Exception as e:
+            print(f"Error initializing auditor for job {job_id}: {e}")
+            self.job_store.finish(job_id, 'failed', error=str(e))
+            return
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(auditor.process_row, row): (idx, row) for idx, row in enumerate(rows)}
+            for future in as_completed(futures):
+                idx, row = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Error processing row {idx + 1} of job {job_id}: {e}")
+                    result = dict(row)
+                    result['AI_Answer'] = f"Error: {e}"
+                self.job_store.add_result(job_id, idx, result)
+
+        if job['kind'] == 'rcm':
+            # Full RCM jobs become runs of the results store, in input order, keyed by job ID.
+            try:
+                results = [result for _, _, result in sorted(self.job_store.get_results(job_id), key=lambda r: r[1])]
+                ResultsStore(CONFIG['paths']['results_store']).write_run(results, run_id=job_id, engagement_id=job['engagement_id'])
+            except Exception as e:
+                print(f"Error saving job {job_id} to the results store: {e}")
+
+        self.job_store.finish(job_id, 'completed')
+        print(f"Job {job_id} completed.")
+
+    def health(self):
+        query_cache = self.index_manager.query_cache
+        return {
+            'status': 'ok',
+            'loaded_engagements': self.index_manager.loaded_engagements(),
+            'semantic_cache': query_cache.stats() if query_cache else None,
+        }
+
+
+class AuditRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # required for chunked result streaming
+    service = None # set by make_server
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length) if length else b''
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split('/') if p]
+
+        if parts == ['health']:
+            return self._send_json(200, self.service.health())
+
+        if len(parts) == 2 and parts[0] == 'jobs':
+            job = self.service.job_store.get_job(parts[1])
+            if job is None:
+                return self._send_json(404, {'error': 'job not found'})
+            return self._send_json(200, job)
+
+        if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'results':
+            return self._stream_results(parts[1])
+
+        self._send_json(404, {'error': 'not found'})
+
+    def _stream_results(self, job_id):
+        if self.service.job_store.get_job(job_id) is None:
+            return self._send_json(404, {'error': 'job not found'})
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        last_seq = -1
+        while True:
+            # Read status before results so rows stored just before completion are never missed.
+            status = self.service.job_store.get_job(job_id)['status']
+            for seq, row_index, result in self.service.job_store.get_results(job_id, last_seq):
+                line = json.dumps({'row_index': row_index, 'result': result}, ensure_ascii=False) + "\n"
+                self._write_chunk(line.encode('utf-8'))
+                last_seq = seq
+            if status in FINISHED_STATUSES:
+                break
+            time.sleep(self.service.poll_interval)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split('/') if p]
+        query = parse_qs(url.query)
+
+        try:
+            if parts == ['jobs', 'control']:
+                payload = json.loads(self._read_body() or b'{}')
+                row = payload.get('row')
+                if not isinstance(row, dict):
+                    return self._send_json(400, {'error': "body must be JSON with a 'row' object"})
+                job_id = self.service.submit_control(row, payload.get('engagement_id'))
+                return self._send_json(202, {'job_id': job_id})
+
+            if parts == ['jobs', 'rcm']:
+                body = self._read_body() # always drain the body so the keep-alive connection stays usable
+                engagement_id = query.get('engagement', [None])[0]
+                job_id = self.service.submit_rcm(body, engagement_id)
+                return self._send_json(202, {'job_id': job_id})
+        except Exception as e:
+            return self._send_json(400, {'error': str(e)})
+
+        self._send_json(404, {'error': 'not found'})
+
+
+def make_server(service, host, port):
+    handler = type('BoundAuditRequestHandler', (AuditRequestHandler,), {'service': service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    settings = CONFIG.get('service', {})
+    parser = argparse.ArgumentParser(description="Run the audit service.")
+    parser.add_argument("--host", default=settings.get('host', '127.0.0.1'))
+    parser.add_argument("--port", type=int, default=settings.get('port', 8080))
+    args = parser.parse_args()
+
+    jobs_db = CONFIG.get('paths', {}).get('jobs_db', str(PROJECT_ROOT / "outputs" / "audit_jobs.db"))
+    service = AuditService(
+        JobStore(jobs_db),
+        max_workers=settings.get('max_workers', 4),
+        control_workers=settings.get('control_workers', 2),
+    )
+    service.start()
+
+    server = make_server(service, args.host, args.port)
+    print(f"Audit service listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down...")
+    finally:
+        server.server_close()
+        service.stop()
+        query_cache = service.index_manager.query_cache
+        if query_cache:
+            query_cache.save()
+
+
+if __name__ == "__main__":
+    main()
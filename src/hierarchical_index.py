@@ -0,0 +1,114 @@
+import json
+import os
+import re
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+PARENTS_FILE = "parents.json"
+
+
+def parent_id_for(metadata):
+    """Parents are PDF pages: '<file name>#p<page>'."""
+    return f"{os.path.basename(str(metadata.get('source', 'unknown')))}#p{metadata.get('page', 'N/A')}"
+
+
+def extractive_summary(text, max_chars=300):
+    """Leading sentences of the section, whitespace-collapsed, cut at `max_chars` (no LLM call)."""
+    text = re.sub(r'\s+', ' ', text).strip()
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    sentence_end = max(cut.rfind('. '), cut.rfind('; '))
+    if sentence_end > max_chars // 2:
+        return cut[:sentence_end + 1]
+    return cut.rsplit(' ', 1)[0] + "..."
+
+
+def build_parents_and_children(pages, child_chunk_size=400, child_chunk_overlap=50, summary_chars=300):
+    """
+    Splits PyPDFLoader pages into small child chunks (for vector matching) and a parent store
+    (one entry per page: full text + precomputed summary). Children carry their `parent_id`.
+    """
+    parents = {}
+    for page in pages:
+        if not page.page_content.strip():
+            continue
+        pid = parent_id_for(page.metadata)
+        parents[pid] = {
+            'text': page.page_content,
+            'summary': extractive_summary(page.page_content, summary_chars),
+            'metadata': {k: v for k, v in page.metadata.items() if isinstance(v, (str, int, float, bool))},
+        }
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=child_chunk_size, chunk_overlap=child_chunk_overlap)
+    children = splitter.split_documents([p for p in pages if parent_id_for(p.metadata) in parents])
+    for child in children:
+        child.metadata['parent_id'] = parent_id_for(child.metadata)
+    return parents, children
+
+
+class HierarchicalStore:
+    """
+    Two-level index: child chunks in FAISS, parent pages stored once.
+    `similarity_search` has the FAISS signature but returns deduplicated parent Documents, ranked by
+    their best-matching child, with the parent's `summary` and matched child count in metadata.
+    Only the top `full_text_parents` carry the full page text; lower-ranked parents are returned as
+    their precomputed summary (`content_type: "summary"`), which keeps the context short.
+    """
+
+    def __init__(self, vector_store, parents, child_k=30, max_parents=5, full_text_parents=2):
+        self.vector_store = vector_store
+        self.parents = parents
+        self.child_k = child_k
+        self.max_parents = max_parents
+        self.full_text_parents = full_text_parents
+
+    @property
+    def index(self):
+        return self.vector_store.index
+
+    def similarity_search(self, query, k=5):
+        n_parents = min(k, self.max_parents)
+        children = self.vector_store.similarity_search(query, k=max(self.child_k, n_parents))
+
+        ranked = []
+        matches = {}
+        for child in children:
+            pid = child.metadata.get('parent_id')
+            if pid not in self.parents:
+                continue
+            if pid not in matches:
+                ranked.append(pid)
+                matches[pid] = 0
+            matches[pid] += 1
+
+        results = []
+        for rank, pid in enumerate(ranked[:n_parents]):
+            parent = self.parents[pid]
+            full_text = rank < self.full_text_parents
+            metadata = dict(parent['metadata'])
+            metadata.update({
+                'parent_id': pid,
+                'summary': parent['summary'],
+                'matched_children': matches[pid],
+                'content_type': 'full_text' if full_text else 'summary',
+            })
+            results.append(Document(page_content=parent['text'] if full_text else parent['summary'], metadata=metadata))
+        return results
+
+    def size_bytes(self):
+        index = self.vector_store.index
+        size = index.ntotal * index.d * 4
+        docstore = getattr(self.vector_store.docstore, '_dict', {})
+        size += sum(len(doc.page_content.encode('utf-8')) for doc in docstore.values())
+        size += sum(len(p['text'].encode('utf-8')) + len(p['summary'].encode('utf-8')) for p in self.parents.values())
+        return size
+
+    def save_parents(self, index_name):
+        with open(os.path.join(index_name, PARENTS_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.parents, f, ensure_ascii=False)
+
+    @staticmethod
+    def load_parents(index_name):
+        with open(os.path.join(index_name, PARENTS_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
@@ -0,0 +1,321 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_community.vectorstores import FAISS
+from config import CONFIG, PROJECT_ROOT
+from llm_factory import get_embeddings, get_embedding_namespace, is_local_embeddings
+from semantic_cache import SemanticQueryCache
+from hierarchical_index import HierarchicalStore, build_parents_and_children
+
+DEFAULT_ENGAGEMENT = "default"
+# Engagement IDs become folder and file names: no separators, dots or other path syntax.
+ENGAGEMENT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+def validate_engagement_id(engagement_id):
+    """Returns the engagement ID (default if empty); raises ValueError if it is not a safe name."""
+    engagement_id = engagement_id or DEFAULT_ENGAGEMENT
+    if not isinstance(engagement_id, str) or not ENGAGEMENT_ID_PATTERN.match(engagement_id):
+        raise ValueError(f"Invalid engagement ID {engagement_id!r}: only letters, digits, '_' and '-' are allowed.")
+    return engagement_id
+
+
+def engagement_output_path(output_file, engagement_id=None):
+    """Per-engagement variant of an output file: `<name>_<id><ext>`; the default engagement keeps the original name."""
+    engagement_id = validate_engagement_id(engagement_id)
+    if engagement_id == DEFAULT_ENGAGEMENT:
+        return output_file
+    root, ext = os.path.splitext(output_file)
+    return f"{root}_{engagement_id}{ext}"
+
+
+class IndexManager:
+    """
+    Owns the FAISS indexes of a process.
+
+    The regulation index is loaded once and shared by every engagement. Client indexes are keyed by
+    engagement ID and kept in an LRU bounded by `max_client_index_mb`; the least recently used ones
+    are unloaded (not deleted from disk) when the cap is exceeded.
+
+    Paths (all resolved against PROJECT_ROOT by config.py):
+    - default engagement: `paths.documents_folder` -> `paths.client_index`
+    - engagement <id>:    `paths.engagements_folder`/<id>/documents -> `paths.engagements_folder`/<id>/faiss_index_client
+    Index folders get a `__<namespace>` suffix per embedding model (see get_embedding_namespace),
+    except for OpenAI, so indexes built with different embeddings are never mixed, and a `__hier`
+    suffix when `rag_settings.index_mode` is "hierarchical" (parent pages + child chunks).
+    """
+
+    REGULATIONS_KEY = object() # build-lock key of the shared regulation index
+
+    def __init__(self, embeddings=None, max_client_index_mb=None, namespace=None):
+        if embeddings is None:
+            try:
+                embeddings = get_embeddings()
+            except Exception as e:
+                print(f"Warning: Could not initialize Embeddings: {e}")
+        self.embeddings = embeddings
+
+        index_settings = CONFIG.get('index_settings', {})
+        if max_client_index_mb is None:
+            max_client_index_mb = index_settings.get('max_client_index_mb', 2048)
+        self.max_client_index_bytes = max_client_index_mb * 1024 * 1024
+
+        self.namespace = get_embedding_namespace() if namespace is None else namespace
+        rag_settings = CONFIG.get('rag_settings', {})
+        self.index_mode = rag_settings.get('index_mode', 'flat')
+        self.hierarchical_settings = rag_settings.get('hierarchical', {})
+
+        paths = CONFIG.get('paths', {})
+        self.regulations_path = paths.get('regulations_folder', str(PROJECT_ROOT / "regulations"))
+        self.index_path_regs = self._namespaced(paths.get('regulations_index', str(PROJECT_ROOT / "faiss_index_regs")))
+        self.engagements_path = paths.get('engagements_folder', str(PROJECT_ROOT / "engagements"))
+
+        self._regulations_store = None
+        self._regulations_loaded = False
+        self._client_stores = OrderedDict() # engagement_id -> (vector_store, size_bytes), LRU first
+        # `_lock` only guards the bookkeeping above. Builds/loads run outside it, under a lock per
+        # index, so a slow (throttled) build never blocks retrieval from indexes already loaded.
+        self._lock = threading.RLock()
+        self._build_locks = {} # engagement_id (or the regulations key) -> Lock
+
+        # Entries are keyed by index version, so one cache is safely shared by all engagements.
+        self.query_cache = SemanticQueryCache.from_config(CONFIG) if self.embeddings else None
+
+    # ---- Paths -------------------------------------------------------------
+
+    def _namespaced(self, index_path):
+        index_path = index_path.rstrip("/\\")
+        suffixes = [self.namespace] if self.namespace else []
+        if self.index_mode == 'hierarchical':
+            suffixes.append('hier')
+        return "__".join([index_path] + suffixes)
+
+    def client_paths(self, engagement_id=None):
+        """Returns (documents_folder, index_path) for an engagement."""
+        engagement_id = validate_engagement_id(engagement_id)
+        paths = CONFIG.get('paths', {})
+        if engagement_id == DEFAULT_ENGAGEMENT:
+            return (
+                paths.get('documents_folder', str(PROJECT_ROOT / "documents")),
+                self._namespaced(paths.get('client_index', str(PROJECT_ROOT / "faiss_index_client"))),
+            )
+        engagement_dir = os.path.join(self.engagements_path, str(engagement_id))
+        return os.path.join(engagement_dir, "documents"), self._namespaced(os.path.join(engagement_dir, "faiss_index_client"))
+
+    # ---- Stores ------------------------------------------------------------
+
+    def _build_lock(self, key):
+        with self._lock:
+            return self._build_locks.setdefault(key, threading.Lock())
+
+    def get_regulations_store(self):
+        """Loads (or builds) the shared regulation index once per process."""
+        if self._regulations_loaded:
+            return self._regulations_store
+        with self._build_lock(self.REGULATIONS_KEY):
+            if not self._regulations_loaded:
+                store = self.build_or_load_index(self.index_path_regs, self.regulations_path)
+                with self._lock:
+                    self._regulations_store = store
+                    self._regulations_loaded = store is not None
+            return self._regulations_store
+
+    def get_client_store(self, engagement_id=None):
+        """
+        Returns the client index of an engagement, loading/building it and updating the LRU.
+        Raises FileNotFoundError for a non-default engagement whose index can't be loaded or built.
+        """
+        engagement_id = engagement_id or DEFAULT_ENGAGEMENT
+        vector_store = self._loaded_client_store(engagement_id)
+        if vector_store is not None:
+            return vector_store
+
+        documents_path, index_path = self.client_paths(engagement_id)
+        # One build per engagement at a time; other engagements keep being served meanwhile.
+        with self._build_lock(engagement_id):
+            vector_store = self._loaded_client_store(engagement_id) # built by another thread meanwhile
+            if vector_store is not None:
+                return vector_store
+
+            if engagement_id != DEFAULT_ENGAGEMENT and not os.path.exists(index_path) and not os.path.exists(documents_path):
+                # Don't create folders for a (possibly mistyped) engagement that was never set up.
+                raise FileNotFoundError(f"Engagement '{engagement_id}' has no client index ({index_path}) or documents ({documents_path}).")
+            vector_store = self.build_or_load_index(index_path, documents_path)
+            if vector_store is None:
+                if engagement_id != DEFAULT_ENGAGEMENT:
+                    # Auditing without client evidence would silently produce regulation-only answers.
+                    raise FileNotFoundError(f"Could not load or build the client index of engagement '{engagement_id}' from {documents_path}.")
+                return None
+
+            size_bytes = self.estimate_size_bytes(vector_store)
+            with self._lock:
+                self._client_stores[engagement_id] = (vector_store, size_bytes)
+                self._enforce_memory_cap(keep=engagement_id)
+            return vector_store
+
+    def _loaded_client_store(self, engagement_id):
+        """The engagement's loaded index (marked most recently used), or None."""
+        with self._lock:
+            if engagement_id in self._client_stores:
+                self._client_stores.move_to_end(engagement_id)
+                return self._client_stores[engagement_id][0]
+            return None
+
+    def evict(self, engagement_id):
+        """Unloads an engagement's client index from memory."""
+        with self._lock:
+            self._client_stores.pop(engagement_id or DEFAULT_ENGAGEMENT, None)
+
+    def loaded_engagements(self):
+        with self._lock:
+            return list(self._client_stores.keys())
+
+    def loaded_client_bytes(self):
+        with self._lock:
+            return sum(size for _, size in self._client_stores.values())
+
+    @staticmethod
+    def estimate_size_bytes(vector_store):
+        """Approximate resident size: float32 vectors plus the stored chunk text."""
+        if isinstance(vector_store, HierarchicalStore):
+            return vector_store.size_bytes()
+        index = vector_store.index
+        size = index.ntotal * index.d * 4
+        docstore = getattr(vector_store.docstore, '_dict', {})
+        size += sum(len(doc.page_content.encode('utf-8')) for doc in docstore.values())
+        return size
+
+    def _enforce_memory_cap(self, keep):
+        while self.loaded_client_bytes() > self.max_client_index_bytes and len(self._client_stores) > 1:
+            engagement_id = next(iter(self._client_stores))
+            if engagement_id == keep:
+                break
+            self._client_stores.pop(engagement_id)
+            print(f"Unloaded client index for engagement '{engagement_id}' (memory cap {self.max_client_index_bytes // (1024 * 1024)} MB).")
+
+    # ---- Build / load ------------------------------------------------------
+
+    def load_documents_from_folder(self, folder_path):
+        docs = []
+        if not os.path.exists(folder_path):
+            os.makedirs(folder_path)
+            return docs
+
+        print(f"Loading documents from {folder_path}...")
+        for filename in os.listdir(folder_path):
+            if filename.lower().endswith(".pdf"):
+                file_path = os.path.join(folder_path, filename)
+                print(f"Loading {filename}...")
+                try:
+                    loader = PyPDFLoader(file_path)
+                    docs.extend(loader.load())
+                except Exception as e:
+                    print(f"Error loading {filename}: {e}")
+        return docs
+
+    def build_or_load_index(self, index_name, folder_path):
+        """Helper to build or load an index."""
+        if not self.embeddings:
+            print("Embeddings not initialized.")
+            return None
+
+        # Check if index exists on disk
+        if os.path.exists(index_name):
+            print(f"Loading existing index from {index_name}...")
+            try:
+                vector_store = FAISS.load_local(index_name, self.embeddings, allow_dangerous_deserialization=True)
+                if self.index_mode == 'hierarchical':
+                    vector_store = self._hierarchical_store(vector_store, HierarchicalStore.load_parents(index_name))
+                print(f"Index {index_name} loaded successfully.")
+                return vector_store
+            except Exception as e:
+                print(f"Error loading index {index_name}: {e}. Rebuilding...")
+
+        # Build from scratch
+        docs = self.load_documents_from_folder(folder_path)
+        if not docs:
+            print(f"No documents found in {folder_path} to index.")
+            return None
+
+        parents = None
+        if self.index_mode == 'hierarchical':
+            # PyPDFLoader yields one Document per page: pages are the parents, small chunks the children.
+            parents, splits = build_parents_and_children(
+                docs,
+                child_chunk_size=self.hierarchical_settings.get('child_chunk_size', 400),
+                child_chunk_overlap=self.hierarchical_settings.get('child_chunk_overlap', 50),
+                summary_chars=self.hierarchical_settings.get('summary_chars', 300),
+            )
+        else:
+            chunk_size = CONFIG.get('rag_settings', {}).get('chunk_size', 1000)
+            chunk_overlap = CONFIG.get('rag_settings', {}).get('chunk_overlap', 100)
+
+            text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+            splits = text_splitter.split_documents(docs)
+
+        if not splits:
+            print("No text chunks created.")
+            return None
+
+        print(f"Creating vector store for {index_name} with {len(splits)} chunks...")
+
+        if is_local_embeddings(self.embeddings):
+            # In-process embeddings batch internally (multi-process for large builds): no API throttling needed.
+            vector_store = FAISS.from_documents(splits, self.embeddings)
+        else:
+            vector_store = self._build_throttled(splits)
+
+        print(f"Saving index to {index_name}...")
+        vector_store.save_local(index_name)
+        if parents is not None:
+            vector_store = self._hierarchical_store(vector_store, parents)
+            vector_store.save_parents(index_name)
+            print(f"Stored {len(parents)} parent sections for {index_name}.")
+        print(f"Index {index_name} built and saved successfully.")
+        return vector_store
+
+    def _hierarchical_store(self, vector_store, parents):
+        return HierarchicalStore(
+            vector_store,
+            parents,
+            child_k=self.hierarchical_settings.get('child_k', 30),
+            max_parents=self.hierarchical_settings.get('max_parents', 5),
+            full_text_parents=self.hierarchical_settings.get('full_text_parents', 2),
+        )
+
+    def _build_throttled(self, splits):
+        """Embeds remote-API batches with a pause in between to stay under provider rate limits."""
+        batch_size = 10
+        delay_seconds = 5
+        vector_store = None
+
+        total_batches = (len(splits) + batch_size - 1) // batch_size
+        for i in range(0, len(splits), batch_size):
+            batch = splits[i : i + batch_size]
+            print(f"Processing batch {i//batch_size + 1}/{total_batches} ({len(batch)} chunks)...")
+
+            if vector_store is None:
+                vector_store = FAISS.from_documents(batch, self.embeddings)
+            else:
+                vector_store.add_documents(batch)
+
+            if i + batch_size < len(splits):
+                time.sleep(delay_seconds)
+
+        return vector_store
+
+
+_shared_manager = None
+_shared_manager_lock = threading.Lock()
+
+def get_index_manager():
+    """Returns the process-wide IndexManager, so every RagEngine shares the loaded regulation index."""
+    global _shared_manager
+    with _shared_manager_lock:
+        if _shared_manager is None:
+            _shared_manager = IndexManager()
+        return _shared_manager
@@ -1,7 +1,62 @@
 import os
+import json
+import re
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from config import CONFIG, load_config
+from local_embeddings import LocalSentenceTransformerEmbeddings
+
+FAKE_CRITIQUE = {
+    "hallucination_rate": 0.0,
+    "hallucination_count": 0,
+    "total_claims": 0,
+    "score": 5,
+    "reasoning": "Fake provider: no real critique performed.",
+}
+FAKE_ANSWER = (
+    "<verification_step>\nFake provider: no facts verified.\n</verification_step>\n\n"
+    "<answer>\nNot Documented in provided context (fake provider).\n</answer>\n\n"
+    "**COMPLIANCE VERDICT:** Insufficient Info"
+)
+
+class FakeAuditChatModel(BaseChatModel):
+    """
+    Offline, deterministic chat model for local runs (service, notebook) without API keys.
+    Answers critique prompts with a valid critique JSON and everything else with a well-formed
+    auditor response (one per control for batched prompts), so the full parsing pipeline is exercised.
+    """
+
+    @property
+    def _llm_type(self):
+        return "fake-audit"
+
+    @staticmethod
+    def _respond(prompt):
+        # Batched prompts (auditor_*_batch.j2) tag each control as <control ref="...">.
+        refs = list(dict.fromkeys(re.findall(r'<control ref="(.*?)">', prompt)))
+        if '"score"' in prompt and '"reasoning"' in prompt:
+            if refs:
+                return json.dumps([dict(FAKE_CRITIQUE, ref=ref) for ref in refs])
+            return json.dumps(FAKE_CRITIQUE)
+        if "<verification_step>" in prompt:
+            if refs:
+                return "\n\n".join(f'<control ref="{ref}">\n{FAKE_ANSWER}\n</control>' for ref in refs)
+            return FAKE_ANSWER
+        return "Fake provider response."
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        content = self._respond(messages[-1].content if messages else "")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        content = self._respond(messages[-1].content if messages else "")
+        # Word-sized chunks, like a real provider
+        for token in re.findall(r'\S+\s*|\s+', content):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
 
 def get_llm(override_config=None):
     """
@@ -19,6 +74,9 @@ def get_llm(override_config=None):
         if not api_key:
             raise ValueError("GOOGLE_API_KEY or GEMINI_API_KEY not found in environment variables.")
         return ChatGoogleGenerativeAI(model=model_name, temperature=temperature, google_api_key=api_key, max_retries=5)
+
+    elif provider == 'fake':
+        return FakeAuditChatModel()
     
     else: # Default to openai
         model_name = settings.get('openai', {}).get('model', 'gpt-4o-mini')
@@ -27,14 +85,20 @@ def get_llm(override_config=None):
             api_key = api_key.strip()
         return ChatOpenAI(model=model_name, temperature=temperature, openai_api_key=api_key)
 
+DEFAULT_LOCAL_EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+def get_embedding_provider(override_config=None):
+    """Embedding provider: `embedding_settings.provider` if set, otherwise the LLM provider."""
+    conf = override_config if override_config else CONFIG
+    provider = conf.get('embedding_settings', {}).get('provider') or conf.get('llm_settings', {}).get('provider', 'openai')
+    return provider.lower()
+
 def get_embeddings(override_config=None):
     """
     Returns a configured Embeddings instance based on CONFIG or override_config.
     """
     conf = override_config if override_config else CONFIG
-    
-    settings = conf.get('llm_settings', {})
-    provider = settings.get('provider', 'openai').lower()
+    provider = get_embedding_provider(conf)
     
     if provider == 'google':
         model_name = "models/gemini-embedding-001" # Corrected model from list_models
@@ -42,10 +106,43 @@ def get_embeddings(override_config=None):
         if not api_key:
             raise ValueError("GOOGLE_API_KEY or GEMINI_API_KEY not found in environment variables.")
         return GoogleGenerativeAIEmbeddings(model=model_name, google_api_key=api_key)
+
+    elif provider == 'local':
+        local = conf.get('embedding_settings', {}).get('local', {})
+        return LocalSentenceTransformerEmbeddings(
+            model_name=local.get('model', DEFAULT_LOCAL_EMBEDDING_MODEL),
+            batch_size=local.get('batch_size', 64),
+            normalize=local.get('normalize', True),
+            backend=local.get('backend', 'torch'),
+            onnx_file=local.get('onnx_file'),
+            multi_process_threshold=local.get('multi_process_threshold', 2000),
+            processes=local.get('processes'),
+        )
+
+    elif provider == 'fake':
+        return DeterministicFakeEmbedding(size=1536)
     
     else: # Default to openai
         return OpenAIEmbeddings(model="text-embedding-3-small")
 
+def get_embedding_namespace(override_config=None):
+    """
+    Suffix that keeps FAISS indexes of different embedding models apart, so vectors never mix.
+    OpenAI (the original provider) keeps the un-suffixed index folders for backwards compatibility.
+    """
+    conf = override_config if override_config else CONFIG
+    provider = get_embedding_provider(conf)
+    if provider == 'local':
+        model_name = conf.get('embedding_settings', {}).get('local', {}).get('model', DEFAULT_LOCAL_EMBEDDING_MODEL)
+        return "local-" + re.sub(r'[^A-Za-z0-9]+', '-', model_name.split('/')[-1]).strip('-').lower()
+    if provider in ('google', 'fake'):
+        return provider
+    return ""
+
+def is_local_embeddings(embeddings):
+    """True for embeddings computed in-process (no API rate limits to respect while indexing)."""
+    return isinstance(embeddings, (LocalSentenceTransformerEmbeddings, DeterministicFakeEmbedding))
+
 def reload_config_and_reinit():
     """
     Reloads the global CONFIG and clears any cached clients if we were caching them.
@@ -0,0 +1,74 @@
+import os
+import threading
+from langchain_core.embeddings import Embeddings
+
+
+class LocalSentenceTransformerEmbeddings(Embeddings):
+    """
+    CPU embeddings backed by a (multilingual) sentence-transformer, for offline index builds and
+    millisecond query embedding.
+
+    - Documents are encoded in batches; above `multi_process_threshold` texts, encoding is spread
+      over a pool of `processes` CPU workers (index builds).
+    - `backend: "onnx"` loads an ONNX export of the model; point `onnx_file` at a quantized file
+      (e.g. "onnx/model_qint8_avx512.onnx") for int8 inference. Requires `sentence-transformers[onnx]`.
+    The model is loaded lazily on first use.
+    """
+
+    def __init__(self, model_name, batch_size=64, normalize=True, backend="torch", onnx_file=None,
+                 multi_process_threshold=2000, processes=None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.normalize = normalize
+        self.backend = backend
+        self.onnx_file = onnx_file
+        self.multi_process_threshold = multi_process_threshold
+        self.processes = processes or os.cpu_count() or 1
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                self._model = self._load_model()
+            return self._model
+
+    def _load_model(self):
+        from sentence_transformers import SentenceTransformer
+
+        if self.backend == "onnx":
+            model_kwargs = {"file_name": self.onnx_file} if self.onnx_file else None
+            try:
+                print(f"Loading local embedding model {self.model_name} (ONNX{', ' + self.onnx_file if self.onnx_file else ''})...")
+                return SentenceTransformer(self.model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+            except Exception as e:
+                print(f"Warning: Could not load ONNX backend ({e}). Falling back to torch.")
+
+        print(f"Loading local embedding model {self.model_name}...")
+        return SentenceTransformer(self.model_name, device="cpu")
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+
+        if len(texts) >= self.multi_process_threshold and self.processes > 1:
+            print(f"Encoding {len(texts)} texts with {self.processes} CPU processes...")
+            pool = self.model.start_multi_process_pool(target_devices=["cpu"] * self.processes)
+            try:
+                vectors = self.model.encode_multi_process(
+                    texts, pool, batch_size=self.batch_size, normalize_embeddings=self.normalize
+                )
+            finally:
+                self.model.stop_multi_process_pool(pool)
+        else:
+            vectors = self.model.encode(
+                texts, batch_size=self.batch_size, normalize_embeddings=self.normalize, show_progress_bar=False
+            )
+        return vectors.tolist()
+
+    def embed_query(self, text):
+        return self.model.encode(
+            [text], batch_size=1, normalize_embeddings=self.normalize, show_progress_bar=False
+        )[0].tolist()
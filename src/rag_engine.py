@@ -1,24 +1,26 @@
 import os
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_community.vectorstores import FAISS
 from langchain_core.messages import HumanMessage, SystemMessage
 from config import CONFIG
-from llm_factory import get_llm, get_embeddings
-import shutil
+from llm_factory import get_llm
+from index_manager import get_index_manager, DEFAULT_ENGAGEMENT
+from langchain_core.documents import Document
+import hashlib
 import time
 
 class RagEngine:
-    def __init__(self):
-        self.documents_path = CONFIG['paths']['documents_folder']
-        self.index_path_client = "faiss_index_client"
-        self.vector_store = None
-        
+    def __init__(self, engagement_id=None, index_manager=None):
+        # Indexes are owned by a (process-wide by default) IndexManager: the regulation index is
+        # shared across engagements, client indexes are keyed by engagement ID.
+        self.index_manager = index_manager or get_index_manager()
+        self.engagement_id = engagement_id or DEFAULT_ENGAGEMENT
+
+        # The stores themselves are not kept here: the manager must be able to unload an
+        # engagement's index (memory cap) without an engine still holding a reference to it.
+        self.documents_path, self.index_path_client = self.index_manager.client_paths(self.engagement_id)
+
         # Phase 2: Regulations Paths
-        self.regulations_path = "regulations"
-        self.index_path_regs = "faiss_index_regs"
-        self.vector_store_regs = None
+        self.regulations_path = self.index_manager.regulations_path
+        self.index_path_regs = self.index_manager.index_path_regs
 
         # Load document language from config
         self.doc_language = CONFIG['rag_settings'].get('document_language', 'English')
@@ -26,93 +28,18 @@ class RagEngine:
         # Initialize LLM for translation/HyDE
         self.llm = get_llm()
         
-        try:
-            self.embeddings = get_embeddings()
-        except Exception as e:
-            print(f"Warning: Could not initialize Embeddings: {e}")
-            self.embeddings = None
-
-    def load_documents_from_folder(self, folder_path):
-        docs = []
-        if not os.path.exists(folder_path):
-            os.makedirs(folder_path)
-            return docs
-
-        print(f"Loading documents from {folder_path}...")
-        for filename in os.listdir(folder_path):
-            if filename.lower().endswith(".pdf"):
-                file_path = os.path.join(folder_path, filename)
-                print(f"Loading {filename}...")
-                try:
-                    loader = PyPDFLoader(file_path)
-                    docs.extend(loader.load())
-                except Exception as e:
-                    print(f"Error loading {filename}: {e}")
-        return docs
-
-    def _build_or_load_index(self, index_name, folder_path):
-        """Helper to build or load an index."""
-        if not self.embeddings:
-            print("Embeddings not initialized.")
-            return None
-
-        # Check if index exists on disk
-        if os.path.exists(index_name):
-            print(f"Loading existing index from {index_name}...")
-            try:
-                vector_store = FAISS.load_local(index_name, self.embeddings, allow_dangerous_deserialization=True)
-                print(f"Index {index_name} loaded successfully.")
-                return vector_store
-            except Exception as e:
-                print(f"Error loading index {index_name}: {e}. Rebuilding...")
-
-        # Build from scratch
-        docs = self.load_documents_from_folder(folder_path)
-        if not docs:
-            print(f"No documents found in {folder_path} to index.")
-            return None
-        
-        chunk_size = CONFIG.get('rag_settings', {}).get('chunk_size', 1000)
-        chunk_overlap = CONFIG.get('rag_settings', {}).get('chunk_overlap', 100)
-
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-        splits = text_splitter.split_documents(docs)
-
-        if not splits:
-            print("No text chunks created.")
-            return None
-
-        print(f"Creating vector store for {index_name} with {len(splits)} chunks...")
-        
-        batch_size = 10
-        delay_seconds = 5
-        vector_store = None
-        
-        total_batches = (len(splits) + batch_size - 1) // batch_size
-        for i in range(0, len(splits), batch_size):
-            batch = splits[i : i + batch_size]
-            print(f"Processing batch {i//batch_size + 1}/{total_batches} ({len(batch)} chunks)...")
-            
-            if vector_store is None:
-                vector_store = FAISS.from_documents(batch, self.embeddings)
-            else:
-                vector_store.add_documents(batch)
-            
-            if i + batch_size < len(splits):
-                time.sleep(delay_seconds)
+        self.embeddings = self.index_manager.embeddings
 
-        print(f"Saving index to {index_name}...")
-        vector_store.save_local(index_name)
-        print(f"Index {index_name} built and saved successfully.")
-        return vector_store
+        # Semantic cache for near-duplicate questions (skips HyDE + search on a hit), shared per process
+        self.query_cache = self.index_manager.query_cache
 
     def build_index(self):
-        """Builds/Loads the Client Index."""
-        self.vector_store = self._build_or_load_index(self.index_path_client, self.documents_path)
+        """Builds/Loads the Client Index and returns it."""
+        return self.index_manager.get_client_store(self.engagement_id)
 
     def ingest_regulations(self):
-        """Builds/Loads the Regulations Index."""
-        self.vector_store_regs = self._build_or_load_index(self.index_path_regs, self.regulations_path)
+        """Builds/Loads the Regulations Index and returns it."""
+        return self.index_manager.get_regulations_store()
 
     def generate_search_query(self, query):
         """Generates a hypothetical answer (HyDE) in the target document language."""
@@ -127,8 +54,6 @@ class RagEngine:
         ]
         response = None
         # Retry logic for generation
-        from google.api_core.exceptions import ResourceExhausted
-
         max_retries = 5
         base_delay = 20 
 
@@ -150,37 +75,97 @@ class RagEngine:
         return response.content
 
     def retrieve(self, query, k=10):
-        # Ensure indices are ready
-        if not self.vector_store:
-            print("Client Vector store not found. Building...")
-            self.build_index()
-        
-        # Optional: Load regulations if not loaded, but only if they exist or we want to force it.
-        # For now, let's try to load/build it if it's not ready, effectively making it part of the default init or on-demand.
-        if not self.vector_store_regs:
-             print("Regulations Vector store not found. Checking/Building...")
-             self.ingest_regulations()
-
-        # Use HyDE to generate search query
-        print(f"DEBUG: Generating HyDE query in {self.doc_language}...")
-        search_query = self.generate_search_query(query)
+        # Ensure indices are ready. Once loaded this is an LRU lookup in the IndexManager,
+        # which transparently reloads an engagement whose index was unloaded under the memory cap.
+        vector_store = self.build_index()
+        if not vector_store:
+            print("Client Vector store not available.")
+
+        # Regulations are shared across engagements and loaded once per process.
+        vector_store_regs = self.ingest_regulations()
+
+        # Semantic cache: near-identical questions against the same indexes reuse stored results
+        query_vector = None
+        cached = None
+        index_version = None
+        if self.query_cache:
+            try:
+                query_vector = self.embeddings.embed_query(query)
+                index_version = self.index_version()
+                cached = self.query_cache.lookup(query_vector, index_version, k)
+            except Exception as e:
+                print(f"Warning: Semantic cache lookup failed: {e}")
+                query_vector = None
+
+        if cached and 'documents' in cached:
+            print(f"Semantic cache hit (similarity {cached['similarity']:.3f}). Skipping HyDE and search.")
+            return [Document(page_content=d.page_content, metadata=dict(d.metadata)) for d in cached['documents']]
+
+        if cached:
+            print(f"Semantic cache HyDE hit (similarity {cached['similarity']:.3f}). Reusing HyDE query.")
+            search_query = cached['search_query']
+        else:
+            # Use HyDE to generate search query
+            print(f"DEBUG: Generating HyDE query in {self.doc_language}...")
+            search_query = self.generate_search_query(query)
         print(f"Original Query: {query[:50]}...")
         print(f"HyDE Search Query: {search_query[:50]}...")
 
         results = []
         
         # Retrieve from Client Docs
-        if self.vector_store:
-            results.extend(self.vector_store.similarity_search(search_query, k=k))
+        if vector_store:
+            results.extend(vector_store.similarity_search(search_query, k=k))
 
         # Retrieve from Regulations (if any)
-        if self.vector_store_regs:
+        if vector_store_regs:
             # We might want to distinguish sources or limit total K?
             # Let's add top k from regs too.
-            regs_results = self.vector_store_regs.similarity_search(search_query, k=k)
+            regs_results = vector_store_regs.similarity_search(search_query, k=k)
             # Mark them as from regulations if possible (metadata update? FAISS docs are copies)
             for doc in regs_results:
                 doc.metadata['source_type'] = 'regulation'
             results.extend(regs_results)
 
+        if self.query_cache and query_vector is not None:
+            self.query_cache.store(
+                query_vector, index_version, k,
+                [Document(page_content=d.page_content, metadata=dict(d.metadata)) for d in results],
+                search_query,
+            )
+
         return results
+
+    def index_version(self):
+        """Fingerprint of the on-disk indexes; cache entries never cross index rebuilds."""
+        parts = []
+        for index_name in (self.index_path_client, self.index_path_regs):
+            index_file = os.path.join(index_name, "index.faiss")
+            if os.path.exists(index_file):
+                stat = os.stat(index_file)
+                parts.append(f"{os.path.abspath(index_name)}:{stat.st_size}:{stat.st_mtime_ns}")
+            else:
+                parts.append(f"{os.path.abspath(index_name)}:missing")
+        return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def deduplicate_documents(docs):
+        """Drops repeated chunks (same source, page and text), keeping the first (best-ranked) occurrence."""
+        seen = set()
+        unique_docs = []
+        for doc in docs:
+            key = (doc.metadata.get('source'), doc.metadata.get('page'), doc.page_content)
+            if key in seen:
+                continue
+            seen.add(key)
+            unique_docs.append(doc)
+        return unique_docs
+
+    def retrieve_group(self, queries, k=15, topic=None):
+        """
+        Retrieves ONE shared context for a group of related queries (e.g. all controls under a Scope).
+        A single HyDE call and a single search per store replace one of each per query.
+        """
+        header = f"Audit topic: {topic}. " if topic else ""
+        combined_query = header + "Questions:\n" + "\n".join(f"- {q}" for q in queries)
+        return self.deduplicate_documents(self.retrieve(combined_query, k=k))
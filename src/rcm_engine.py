@@ -1,16 +1,86 @@
+import hashlib
 import json
 import pandas as pd
 from jinja2 import Environment, FileSystemLoader
 from config import CONFIG, PROJECT_ROOT
 from rag_engine import RagEngine
+from index_manager import engagement_output_path
 from llm_factory import get_llm
 from langchain_core.messages import HumanMessage
 import os
+import re
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+def chunk_text(chunk):
+    """Text of a streamed message chunk (some providers stream lists of content parts)."""
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    return "".join(part.get('text', '') if isinstance(part, dict) else str(part) for part in content)
+
+
+class StreamingResponseParser:
+    """
+    Incrementally parses a streamed auditor response. `feed` returns the sections
+    ('verification_step', 'answer') that closed with the new text, each reported once.
+    """
+
+    SECTION_PATTERNS = {
+        'verification_step': re.compile(r'<verification_step>(.*?)(?:</verification_step>|<answer>|\*\*COMPLIANCE)', re.DOTALL | re.IGNORECASE),
+        'answer': re.compile(r'<answer>(.*?)(?:</answer>|\*\*COMPLIANCE)', re.DOTALL | re.IGNORECASE),
+    }
 
-class RcmAuditor:
     def __init__(self):
-        self.rag_engine = RagEngine()
+        self.buffer = ""
+        self.emitted = set()
+
+    def feed(self, text):
+        self.buffer += text
+        completed = []
+        for section, pattern in self.SECTION_PATTERNS.items():
+            if section in self.emitted:
+                continue
+            match = pattern.search(self.buffer)
+            if match:
+                self.emitted.add(section)
+                completed.append((section, match.group(1).strip()))
+        return completed
+
+    def close(self):
+        """Reports sections still open when the stream ends, using the same fallbacks as parse_response."""
+        verification_step, final_answer, _ = RcmAuditor.parse_response(self.buffer)
+        remaining = []
+        if 'verification_step' not in self.emitted and verification_step:
+            remaining.append(('verification_step', verification_step))
+        if 'answer' not in self.emitted:
+            remaining.append(('answer', final_answer))
+        self.emitted.update(section for section, _ in remaining)
+        return remaining
+
+
+# Topics of the client summary (same order and headers as templates/client_summary.j2)
+CLIENT_SUMMARY_TOPICS = [
+    ("Model Governance and Oversight", "roles, responsibilities, committees, and approval processes"),
+    ("Data Quality and Sources", "data inputs, sources, quality controls, and history used"),
+    ("Segmentation", "how the portfolio is segmented for risk analysis"),
+    ("Definition of Default", "the specific criteria used to define default, e.g., days past due, unlikely to pay"),
+    ("Risk Contagion", "rules regarding contagion of default status across different products/obligations"),
+    ("PD (Probability of Default)", "the methodology for estimating PD, including 12-month and Lifetime PD"),
+    ("LGD (Loss Given Default)", "the methodology for estimating LGD, including recovery rates and collateral"),
+    ("EAD / CCF (Exposure at Default / Credit Conversion Factor)", "how EAD and CCF are calculated for on-balance and off-balance sheet exposures"),
+    ("Macro Scenarios", "the macroeconomic scenarios used for forward-looking adjustment"),
+    ("Forward-Looking Information", "how forward-looking information is incorporated into the ECL calculation"),
+    ("ECL Calculation", "the formula or process for aggregation of Expected Credit Loss"),
+    ("Model Monitoring", "the framework for backtesting, benchmarking, and ongoing performance monitoring"),
+    ("Model Overrides", "the policy for expert judgment overrides or post-model adjustments"),
+]
+
+
+class RcmAuditor:
+    def __init__(self, engagement_id=None, index_manager=None):
+        # engagement_id selects the client index; the regulation index is shared process-wide.
+        self.rag_engine = RagEngine(engagement_id=engagement_id, index_manager=index_manager)
         self.llm = get_llm()
         # Templates are in the project root 'templates' folder
         template_dir = os.path.join(PROJECT_ROOT, 'templates')
@@ -25,13 +95,7 @@ class RcmAuditor:
     def initialize_rag(self):
         self.rag_engine.build_index()
 
-    def generate_client_summary(self):
-        output_file = "outputs/client_summary.md"
-        if os.path.exists(output_file):
-            print(f"Client summary already exists at {output_file}")
-            return
-            
-        print("Generating Client Summary...")
+    def _client_summary_prompt(self):
         # Broad query covering all 13 required topics to maximize retrieval relevance
         query = (
             "Summarize the client's policy on: Model Governance, Data Quality, Segmentation, "
@@ -43,10 +107,34 @@ class RcmAuditor:
         docs = self.rag_engine.retrieve(query, k=15) 
         
         context_text = "\n\n".join([d.page_content for d in docs])
-        
+        template = self.jinja_env.get_template('client_summary.j2')
+        return template.render(context=context_text)
+
+    def client_summary_path(self):
+        """Summary file of this auditor's engagement (the default engagement keeps the original name)."""
+        output_file = CONFIG.get('paths', {}).get('client_summary', os.path.join(PROJECT_ROOT, "outputs", "client_summary.md"))
+        return engagement_output_path(output_file, self.rag_engine.engagement_id)
+
+    def generate_client_summary(self, mode=None, force=False):
+        """
+        Generates the client summary.
+        - "map_reduce" (default): one focused retrieval + LLM call per topic, run concurrently and
+          cached per topic; only topics whose retrieved evidence changed are regenerated.
+        - "single": one broad retrieval and one LLM call; skipped if the file exists unless `force`.
+        """
+        if mode is None:
+            mode = CONFIG.get('summary_settings', {}).get('mode', 'map_reduce')
+        if mode == 'map_reduce':
+            return self.generate_client_summary_map_reduce(force=force)
+
+        output_file = self.client_summary_path()
+        if os.path.exists(output_file) and not force:
+            print(f"Client summary already exists at {output_file}")
+            return
+            
+        print("Generating Client Summary...")
         try:
-            template = self.jinja_env.get_template('client_summary.j2')
-            prompt = template.render(context=context_text)
+            prompt = self._client_summary_prompt()
             
             response = self.llm.invoke([HumanMessage(content=prompt)])
             summary = response.content
@@ -57,57 +145,229 @@ class RcmAuditor:
         except Exception as e:
             print(f"Error generating client summary: {e}")
 
-    def process_row(self, row):
-        # a) Combine 'Control Reference' + 'Design Effectiveness Assessment' (+ optional Test Procedure) from CSV into a query.
+    def _summarize_topic(self, number, title, focus, cached, index_version, topic_k, template_hash, force):
+        """Map step for one topic. Returns (cache_entry, status) with status 'cached', 'unchanged' or 'generated'."""
+        # Anything that changes the prompt besides the evidence: template source, topic_k and the topic itself.
+        settings_key = json.dumps([template_hash, topic_k, number, title, focus])
+        settings_hash = hashlib.sha1(settings_key.encode('utf-8')).hexdigest()
+        if cached and not force and cached.get('index_version') == index_version and cached.get('settings_hash') == settings_hash:
+            return cached, 'cached'
+
+        query = f"Client policy on {title}: {focus}."
+        docs = self.rag_engine.retrieve(query, k=topic_k)
+        context_text, _ = self.format_context(docs)
+
+        # Same retrieved chunks + same settings => same section: reuse it even if the index was rebuilt.
+        # Keyed on the chunks, not the rendered prompt, so their (unstable) HyDE-driven order doesn't matter.
+        evidence = sorted(
+            (str(d.metadata.get('source', '')), str(d.metadata.get('page', '')), d.page_content)
+            for d in docs
+        )
+        fingerprint = hashlib.sha1(json.dumps([settings_hash, evidence], ensure_ascii=False).encode('utf-8')).hexdigest()
+        if cached and not force and cached.get('fingerprint') == fingerprint:
+            return dict(cached, index_version=index_version), 'unchanged'
+
+        template = self.jinja_env.get_template('client_summary_topic.j2')
+        prompt = template.render(number=number, title=title, focus=focus, context=context_text)
+        response = self._invoke_with_retry(prompt, label=f"summary of '{title}'")
+        entry = {'index_version': index_version, 'settings_hash': settings_hash, 'fingerprint': fingerprint}
+        return dict(entry, summary=response.content.strip()), 'generated'
+
+    def generate_client_summary_map_reduce(self, force=False):
+        """Map: summarize each topic concurrently with its own focused context. Reduce: assemble the sections in order."""
+        return "".join(self._stream_map_reduce_summary(force=force))
+
+    def _stream_map_reduce_summary(self, force=False, output_file=None):
+        """
+        Runs the map-reduce summary and yields the document in order: each section is yielded as
+        soon as its topic and all topics before it are done. Saves the file and the topic cache at the end.
+        """
+        settings = CONFIG.get('summary_settings', {})
+        max_workers = settings.get('max_workers', 4)
+        topic_k = settings.get('topic_k', 6)
+        cache_file = CONFIG.get('paths', {}).get('client_summary_cache', os.path.join(PROJECT_ROOT, "outputs", "client_summary_cache.json"))
+        output_file = output_file or self.client_summary_path()
+        engagement_id = self.rag_engine.engagement_id
+
+        cache = {}
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file, "r", encoding="utf-8") as f:
+                    cache = json.load(f)
+            except Exception as e:
+                print(f"Warning: Could not read summary cache {cache_file}: {e}")
+        topic_cache = cache.get(engagement_id, {})
+
+        # Make sure the indexes are loaded before the version is fingerprinted.
+        self.rag_engine.build_index()
+        self.rag_engine.ingest_regulations()
+        index_version = self.rag_engine.index_version()
+        template_source = self.jinja_env.loader.get_source(self.jinja_env, 'client_summary_topic.j2')[0]
+        template_hash = hashlib.sha1(template_source.encode('utf-8')).hexdigest()
+
+        print(f"Generating Client Summary (map-reduce, {len(CLIENT_SUMMARY_TOPICS)} topics)...")
+        sections = {}
+        parts = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self._summarize_topic, number, title, focus, topic_cache.get(title), index_version, topic_k, template_hash, force): title
+                for number, (title, focus) in enumerate(CLIENT_SUMMARY_TOPICS, start=1)
+            }
+            for future in as_completed(futures):
+                title = futures[future]
+                try:
+                    entry, status = future.result()
+                    topic_cache[title] = entry
+                    sections[title] = entry['summary']
+                    print(f"Topic '{title}': {status}.")
+                except Exception as e:
+                    print(f"Error summarizing topic '{title}': {e}")
+                    sections[title] = (topic_cache.get(title) or {}).get('summary', "Not Documented (generation failed).")
+
+                # Reduce incrementally: emit every section whose predecessors are all done.
+                while len(parts) < len(CLIENT_SUMMARY_TOPICS) and CLIENT_SUMMARY_TOPICS[len(parts)][0] in sections:
+                    number = len(parts) + 1
+                    title = CLIENT_SUMMARY_TOPICS[number - 1][0]
+                    part = ("\n\n" if parts else "") + f"## {number}. {title}\n\n{sections[title]}"
+                    parts.append(part)
+                    yield part
+
+        summary = "".join(parts)
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write(summary + "\n")
+        print(f"Client summary saved to {output_file}")
+
+        cache[engagement_id] = topic_cache
+        with open(cache_file, "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=4, ensure_ascii=False)
+
+    def stream_client_summary(self, output_file=None, mode=None, force=False):
+        """
+        Streaming variant of generate_client_summary (same mode, file and cache):
+        - "map_reduce" (default): yields each topic section, in order, as soon as it is ready.
+        - "single": yields the single call's text as it is generated (always regenerates).
+        The complete document is saved at the end.
+        """
+        if mode is None:
+            mode = CONFIG.get('summary_settings', {}).get('mode', 'map_reduce')
+        if mode == 'map_reduce':
+            yield from self._stream_map_reduce_summary(force=force, output_file=output_file)
+            return
+
+        output_file = output_file or self.client_summary_path()
+        print("Generating Client Summary (streaming)...")
+        prompt = self._client_summary_prompt()
+
+        parts = []
+        for text in self._stream_with_retry(prompt, label="client summary"):
+            parts.append(text)
+            yield text
+
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write("".join(parts))
+        print(f"Client summary saved to {output_file}")
+
+    def build_query(self, row):
+        """Combines 'Control Reference' + 'Design Effectiveness Assessment' (+ optional Test Procedure) into a query."""
         control_ref = row.get('Control Reference', 'Unknown')
         # KEY FIX: Use the question/assessment intent, not just the test steps.
         design_assessment = row.get('Design Effectiveness Assessment', '')
         test_procedure = row.get('Test Procedures', row.get('Test Procedure', ''))
-        
+
         # Construct a richer query
-        query = f"Control Ref: {control_ref}. Question: {design_assessment} (Procedure: {test_procedure})"
-        
-        # b) Retrieve context using the new Spanish-translation logic (handled in RagEngine)
-        retrieved_docs = self.rag_engine.retrieve(query, k=10)
-        context_text = "\n\n".join([f"[Page {d.metadata.get('page', 'N/A')}] {d.page_content}" for d in retrieved_docs])
-        evidence_used = [f"Page {d.metadata.get('page', 'N/A')}" for d in retrieved_docs]
+        return f"Control Ref: {control_ref}. Question: {design_assessment} (Procedure: {test_procedure})"
 
-        # c) Call the LLM with a prompt from the template
-        template = self.jinja_env.get_template('auditor_response.j2')
-        prompt_text = template.render(context=context_text, query=query)
+    @staticmethod
+    def format_context(docs):
+        """
+        Returns the page-tagged context text and the evidence list for a set of retrieved docs.
+        Section summaries (lower-ranked hierarchical parents) are labelled as such.
+        """
+        context_text = "\n\n".join([
+            f"[Page {d.metadata.get('page', 'N/A')}]"
+            + (" (section summary)" if d.metadata.get('content_type') == 'summary' else "")
+            + f" {d.page_content}"
+            for d in docs
+        ])
+        evidence_used = [f"Page {d.metadata.get('page', 'N/A')}" for d in docs]
+        return context_text, evidence_used
 
-        # Retry logic for generation
-        from google.api_core.exceptions import ResourceExhausted
+    @staticmethod
+    def cited_evidence(answer, evidence_used):
+        """
+        The pages of `evidence_used` that an answer cites as [Page X], in citation order.
+        With a shared (Scope-level) context, this is each control's own evidence.
+        """
+        available = set(evidence_used)
+        cited = []
+        for citation in re.findall(r'\[Page\s*([^\]]+)\]', str(answer or ''), re.IGNORECASE):
+            for page in re.split(r'\s*(?:,|;|\band\b)\s*', citation):
+                label = "Page " + re.sub(r'^Page\s*', '', page.strip(), flags=re.IGNORECASE)
+                if label in available and label not in cited:
+                    cited.append(label)
+        return cited
+
+    @staticmethod
+    def error_result(row, error):
+        """Result for a control that could not be audited (same shape run_audit writes for failed rows)."""
+        result = dict(row)
+        result['AI_Answer'] = f"Error: {error}"
+        return result
 
+    def _invoke_with_retry(self, prompt_text, label="generation"):
+        """Invokes the LLM with exponential backoff on rate limits (429 / RESOURCE_EXHAUSTED)."""
         max_retries = 5
         base_delay = 20 # Start with 20 seconds as requested
 
         for attempt in range(max_retries):
             try:
-                response = self.llm.invoke([HumanMessage(content=prompt_text)])
-                break
+                return self.llm.invoke([HumanMessage(content=prompt_text)])
             except Exception as e:
                 # Check for ResourceExhausted or similar 429
                 if "429" in str(e) or "RESOURCE_EXHAUSTED" in str(e):
                     if attempt < max_retries - 1:
                         wait_time = base_delay * (2 ** attempt) # Exponential backoff: 20, 40, 80...
-                        print(f"Rate limit hit. Waiting {wait_time}s before retry {attempt + 1}/{max_retries}...")
+                        print(f"Rate limit hit during {label}. Waiting {wait_time}s before retry {attempt + 1}/{max_retries}...")
                         time.sleep(wait_time)
                     else:
                         raise e # Re-raise if retries exhausted
                 else:
                     raise e # Re-raise other errors immediately
-        
-        full_response = response.content
-        
-        # Extract Verification Step and Answer using regex
-        import re
+
+    def _stream_with_retry(self, prompt_text, label="generation"):
+        """
+        Streams the LLM output as text chunks. Rate limits are retried with backoff only until the
+        first chunk arrives; after that, errors propagate (the partial output is already consumed).
+        """
+        max_retries = 5
+        base_delay = 20
+
+        for attempt in range(max_retries):
+            started = False
+            try:
+                for chunk in self.llm.stream([HumanMessage(content=prompt_text)]):
+                    text = chunk_text(chunk)
+                    if text:
+                        started = True
+                        yield text
+                return
+            except Exception as e:
+                if not started and ("429" in str(e) or "RESOURCE_EXHAUSTED" in str(e)) and attempt < max_retries - 1:
+                    wait_time = base_delay * (2 ** attempt)
+                    print(f"Rate limit hit during {label}. Waiting {wait_time}s before retry {attempt + 1}/{max_retries}...")
+                    time.sleep(wait_time)
+                else:
+                    raise e
+
+    @staticmethod
+    def parse_response(full_response):
+        """Extracts (verification_step, final_answer, compliance_verdict) from a raw auditor response."""
         verification_match = re.search(r'<verification_step>(.*?)(?:</verification_step>|<answer>|\*\*COMPLIANCE|$)', full_response, re.DOTALL | re.IGNORECASE)
         verification_step = verification_match.group(1).strip() if verification_match else ""
-        
+
         answer_match = re.search(r'<answer>(.*?)(?:</answer>|\*\*COMPLIANCE|$)', full_response, re.DOTALL | re.IGNORECASE)
         final_answer = answer_match.group(1).strip() if answer_match else ""
-        
+
         # Parse Verdict
         compliance_verdict = "Insufficient Info"
         if "**COMPLIANCE VERDICT:**" in full_response:
@@ -133,10 +393,17 @@ class RcmAuditor:
             if not final_answer:
                 final_answer = full_response
 
-        # d) VALIDATION STEP: Score the answer (0-10)
+        return verification_step, final_answer, compliance_verdict
+
+    def critique_answer(self, context_text, query, final_answer):
+        """VALIDATION STEP: Scores the answer (0-10). Never raises; failures yield a score of 0."""
         critique_template = self.jinja_env.get_template('auditor_critique.j2')
         validation_prompt = critique_template.render(context=context_text, query=query, answer=final_answer)
 
+        max_retries = 5
+        base_delay = 20
+        validation_result = {'score': 0, 'reasoning': "Critique not run."}
+
         critique_response = None
         for attempt in range(max_retries):
             try:
@@ -160,17 +427,43 @@ class RcmAuditor:
 
         if critique_response:
             try:
-                content = critique_response.content.strip()
-                if content.startswith("```json"):
-                    content = content[7:-3].strip()
-                elif content.startswith("```"):
-                    content = content[3:-3].strip()
-                validation_result = json.loads(content)
+                validation_result = self.parse_json_response(critique_response.content)
             except Exception as e:
                 print(f"Error parsing validation JSON: {e}")
                 validation_result = {'score': 0, 'reasoning': f"Parse Error: {e}"}
 
-        # Construct result
+        return validation_result
+
+    @staticmethod
+    def parse_json_response(content):
+        """JSON payload of a model response, with or without a ``` / ```json fence."""
+        content = content.strip()
+        if content.startswith("```json"):
+            content = content[7:-3].strip()
+        elif content.startswith("```"):
+            content = content[3:-3].strip()
+        return json.loads(content)
+
+    def critique_batch(self, context_text, controls):
+        """
+        Scores several answers on the same context in one call (`controls`: dicts with ref, query, answer).
+        Returns {ref: validation_result} for the controls the model scored; never raises, so callers
+        critique the missing ones individually.
+        """
+        template = self.jinja_env.get_template('auditor_critique_batch.j2')
+        prompt_text = template.render(context=context_text, controls=controls)
+        try:
+            response = self._invoke_with_retry(prompt_text, label="batched critique")
+            scored = self.parse_json_response(response.content)
+            if not isinstance(scored, list):
+                raise ValueError("expected a JSON array")
+        except Exception as e:
+            print(f"Error in batched critique for {', '.join(c['ref'] for c in controls)}: {e}")
+            return {}
+        return {str(item.get('ref', '')).strip(): item for item in scored if isinstance(item, dict)}
+
+    @staticmethod
+    def build_result(row, verification_step, final_answer, compliance_verdict, validation_result, evidence_used):
         result = row.copy()
         result['Verification_Step'] = verification_step
         result['AI_Answer'] = final_answer
@@ -178,5 +471,169 @@ class RcmAuditor:
         result['Validation_Reasoning'] = validation_result.get('reasoning', '')
         result['Compliance_Verdict'] = compliance_verdict
         result['Evidence_Sources'] = ", ".join(evidence_used[:5]) # Top 5 pages
-        
         return result
+
+    def process_row(self, row, retrieved_docs=None):
+        """
+        Audits a single RCM row.
+        If `retrieved_docs` is given (e.g. a Scope-level shared context), retrieval is skipped.
+        """
+        # a) Build the query for this control
+        query = self.build_query(row)
+
+        # b) Retrieve context using the new Spanish-translation logic (handled in RagEngine)
+        if retrieved_docs is None:
+            retrieved_docs = self.rag_engine.retrieve(query, k=10)
+        context_text, evidence_used = self.format_context(retrieved_docs)
+
+        # c) Call the LLM with a prompt from the template
+        verification_step, final_answer, compliance_verdict = self.answer_query(context_text, query)
+
+        # d) VALIDATION STEP: Score the answer (0-10)
+        validation_result = self.critique_answer(context_text, query, final_answer)
+
+        # Construct result
+        return self.build_result(row, verification_step, final_answer, compliance_verdict, validation_result, evidence_used)
+
+    def answer_query(self, context_text, query):
+        """Generates the auditor response for one query. Returns (verification_step, answer, verdict)."""
+        template = self.jinja_env.get_template('auditor_response.j2')
+        prompt_text = template.render(context=context_text, query=query)
+        response = self._invoke_with_retry(prompt_text)
+        return self.parse_response(response.content)
+
+    def stream_row(self, row, retrieved_docs=None):
+        """
+        Streaming variant of process_row. Yields event dicts as the answer is generated:
+          {'event': 'context', 'evidence': [...]}
+          {'event': 'token', 'text': ...}                  raw model output, incrementally
+          {'event': 'verification_step', 'text': ...}      as soon as the section closes
+          {'event': 'answer', 'text': ...}                 as soon as the section closes
+          {'event': 'verdict', 'verdict': ...}
+          {'event': 'critique', 'score': ..., 'reasoning': ...}
+          {'event': 'result', 'result': {...}}             same dict process_row returns
+        The critique starts in the background as soon as the answer section closes, overlapping
+        with the rest of the generation.
+        """
+        query = self.build_query(row)
+        if retrieved_docs is None:
+            retrieved_docs = self.rag_engine.retrieve(query, k=10)
+        context_text, evidence_used = self.format_context(retrieved_docs)
+        yield {'event': 'context', 'evidence': evidence_used}
+
+        template = self.jinja_env.get_template('auditor_response.j2')
+        prompt_text = template.render(context=context_text, query=query)
+
+        parser = StreamingResponseParser()
+        critique_future = None
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            for text in self._stream_with_retry(prompt_text):
+                yield {'event': 'token', 'text': text}
+                for section, value in parser.feed(text):
+                    yield {'event': section, 'text': value}
+                    if section == 'answer':
+                        critique_future = executor.submit(self.critique_answer, context_text, query, value)
+
+            for section, value in parser.close():
+                yield {'event': section, 'text': value}
+
+            verification_step, final_answer, compliance_verdict = self.parse_response(parser.buffer)
+            yield {'event': 'verdict', 'verdict': compliance_verdict}
+
+            if critique_future is None:
+                # The answer section never closed explicitly (e.g. missing tags): critique the parsed answer.
+                critique_future = executor.submit(self.critique_answer, context_text, query, final_answer)
+            validation_result = critique_future.result()
+
+        yield {'event': 'critique', 'score': validation_result.get('score', 0), 'reasoning': validation_result.get('reasoning', '')}
+        yield {'event': 'result', 'result': self.build_result(row, verification_step, final_answer, compliance_verdict, validation_result, evidence_used)}
+
+    def process_scope_group(self, rows, controls_per_call=None):
+        """
+        Grouped execution mode: retrieves once for a whole Scope (one HyDE call + one search per store),
+        then answers every control against that shared, deduplicated context.
+        Controls are processed in batches of controls_per_call: one answer call and one critique call
+        per batch, so the shared context is sent twice per batch rather than twice per control.
+        Each control's Evidence_Sources are the pages its answer cites. Errors are caught per batch
+        and per control, so one failure doesn't discard the rest of the Scope.
+        Returns results in the same order as `rows`.
+        """
+        group_settings = CONFIG.get('rag_settings', {}).get('grouped_retrieval', {})
+        group_by = group_settings.get('group_by', 'Scope')
+        k = group_settings.get('k', 15)
+        if controls_per_call is None:
+            controls_per_call = group_settings.get('controls_per_call', 4)
+        controls_per_call = max(1, controls_per_call)
+
+        scope = rows[0].get(group_by, 'Unknown') if rows else 'Unknown'
+        queries = [self.build_query(row) for row in rows]
+        print(f"Retrieving shared context for {group_by} '{scope}' ({len(rows)} controls)...")
+        shared_docs = self.rag_engine.retrieve_group(queries, k=k, topic=scope)
+
+        results = []
+        for start in range(0, len(rows), controls_per_call):
+            controls = [
+                {'ref': str(row.get('Control Reference', 'Unknown')).strip(), 'query': query, 'row': row}
+                for row, query in zip(rows[start : start + controls_per_call], queries[start : start + controls_per_call])
+            ]
+            results.extend(self._process_shared_batch(controls, shared_docs))
+        return results
+
+    def _answer_batch(self, controls, context_text):
+        """One answer call for several controls. Returns {ref: parsed response}; {} if the call fails."""
+        template = self.jinja_env.get_template('auditor_response_batch.j2')
+        prompt_text = template.render(context=context_text, controls=controls)
+        try:
+            response = self._invoke_with_retry(prompt_text, label="batched generation")
+        except Exception as e:
+            # Only this batch is affected: its controls are answered one by one.
+            print(f"Error in batched generation for {', '.join(c['ref'] for c in controls)}: {e}")
+            return {}
+        return {
+            ref.strip(): self.parse_response(body)
+            for ref, body in re.findall(r'<control ref="(.*?)">(.*?)</control>', response.content, re.DOTALL | re.IGNORECASE)
+        }
+
+    def _cited_context(self, answer, docs):
+        """Context text of only the pages an answer cites (all of `docs` if it cites none of them)."""
+        _, evidence_used = self.format_context(docs)
+        cited = set(self.cited_evidence(answer, evidence_used))
+        cited_docs = [d for d, label in zip(docs, evidence_used) if label in cited]
+        return self.format_context(cited_docs or docs)[0]
+
+    def _process_shared_batch(self, controls, shared_docs):
+        """Answers and critiques one batch of controls on the shared context; results in `controls` order."""
+        context_text, evidence_used = self.format_context(shared_docs)
+        answers = self._answer_batch(controls, context_text) if len(controls) > 1 else {}
+
+        results = [None] * len(controls)
+        answered = []
+        for i, control in enumerate(controls):
+            try:
+                parsed = answers.get(control['ref'])
+                if parsed is None:
+                    if len(controls) > 1:
+                        # The model skipped this control (or the batch failed): single call on the shared context.
+                        print(f"Control {control['ref']} missing from batched response. Answering individually...")
+                    parsed = self.answer_query(context_text, control['query'])
+                answered.append((i, control, parsed))
+            except Exception as e:
+                print(f"Error processing control {control['ref']}: {e}")
+                results[i] = self.error_result(control['row'], e)
+
+        critiques = {}
+        if len(answered) > 1:
+            critiques = self.critique_batch(context_text, [
+                {'ref': control['ref'], 'query': control['query'], 'answer': final_answer}
+                for _, control, (_, final_answer, _) in answered
+            ])
+
+        for i, control, (verification_step, final_answer, compliance_verdict) in answered:
+            validation_result = critiques.get(control['ref'])
+            if validation_result is None:
+                # Scored alone: only the pages the answer cites are sent, not the whole shared context.
+                validation_result = self.critique_answer(self._cited_context(final_answer, shared_docs), control['query'], final_answer)
+            result = self.build_result(control['row'], verification_step, final_answer, compliance_verdict, validation_result, evidence_used)
+            result['Evidence_Sources'] = ", ".join(self.cited_evidence(final_answer, evidence_used))
+            results[i] = result
+        return results
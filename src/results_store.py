@@ -0,0 +1,169 @@
+import hashlib
+import json
+import math
+import os
+import time
+import uuid
+import pandas as pd
+
+# Fixed columns scanned by validation and cross-run comparisons; the full row is kept in `row_json`.
+RESULT_COLUMNS = {
+    'control_reference': 'Control Reference',
+    'scope': 'Scope',
+    'question': 'Design Effectiveness Assessment',
+    'verification_step': 'Verification_Step',
+    'ai_answer': 'AI_Answer',
+    'compliance_verdict': 'Compliance_Verdict',
+    'validation_score': 'Validation_Score',
+    'validation_reasoning': 'Validation_Reasoning',
+    'evidence_sources': 'Evidence_Sources',
+}
+SCORE_KEY = ['control_reference', 'ai_hash', 'expert_hash', 'scoring_version']
+
+
+def content_hash(text):
+    """Stable hash of an answer; missing/NaN answers hash like the empty string."""
+    if text is None or (isinstance(text, float) and math.isnan(text)):
+        text = ""
+    return hashlib.sha1(str(text).encode('utf-8')).hexdigest()
+
+
+def normalize_reference(value):
+    """Control Reference as a clean string (same normalization validate_audit applies)."""
+    return str(value).strip()
+
+
+class ResultsStore:
+    """
+    Columnar (Parquet) store of audit results.
+
+    Layout under `root`:
+      runs/run_id=<run_id>/part-0.parquet   one file per run (hive-partitioned by run_id)
+      validation_scores.parquet             expert-comparison scores keyed by control + answer hashes
+      csv_cache/<key>.parquet               parsed copies of input CSVs, keyed by path, size and mtime
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.runs_path = os.path.join(root, "runs")
+        self.scores_path = os.path.join(root, "validation_scores.parquet")
+        self.csv_cache_path = os.path.join(root, "csv_cache")
+
+    # ---- Runs --------------------------------------------------------------
+
+    @staticmethod
+    def new_run_id():
+        return time.strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:6]
+
+    def write_run(self, results, run_id=None, engagement_id="default"):
+        """Stores one run (list of result dicts, as saved to audit_results.json). Returns the run ID."""
+        run_id = run_id or self.new_run_id()
+        records = []
+        for result in results:
+            record = {column: result.get(key) for column, key in RESULT_COLUMNS.items()}
+            record['control_reference'] = normalize_reference(result.get('Control Reference'))
+            for column in ('scope', 'question', 'verification_step', 'ai_answer', 'compliance_verdict', 'validation_reasoning', 'evidence_sources'):
+                value = record[column]
+                record[column] = None if value is None or (isinstance(value, float) and math.isnan(value)) else str(value)
+            score = pd.to_numeric(record['validation_score'], errors='coerce')
+            record['validation_score'] = None if pd.isna(score) else float(score)
+            record['ai_hash'] = content_hash(result.get('AI_Answer'))
+            record['row_json'] = json.dumps(result, ensure_ascii=False, default=str)
+            records.append(record)
+
+        df = pd.DataFrame(records, columns=list(RESULT_COLUMNS) + ['ai_hash', 'row_json'])
+        df.insert(0, 'engagement_id', engagement_id)
+        df.insert(1, 'created_at', pd.Timestamp.now(tz='UTC'))
+
+        run_dir = os.path.join(self.runs_path, f"run_id={run_id}")
+        os.makedirs(run_dir, exist_ok=True)
+        df.to_parquet(os.path.join(run_dir, "part-0.parquet"), index=False)
+        print(f"Stored run {run_id} ({len(df)} rows) in {self.runs_path}")
+        return run_id
+
+    def _scan(self, columns=None, filters=None):
+        if not os.path.exists(self.runs_path) or not os.listdir(self.runs_path):
+            return pd.DataFrame(columns=(columns or []) + ['run_id'])
+        df = pd.read_parquet(self.runs_path, columns=columns, filters=filters)
+        if 'run_id' in df.columns:
+            df['run_id'] = df['run_id'].astype(str)
+        return df
+
+    def list_runs(self, engagement_id=None):
+        """One row per run: run_id, engagement_id, created_at, rows. Oldest first."""
+        filters = [('engagement_id', '==', engagement_id)] if engagement_id else None
+        df = self._scan(columns=['run_id', 'engagement_id', 'created_at'], filters=filters)
+        if df.empty:
+            return pd.DataFrame(columns=['run_id', 'engagement_id', 'created_at', 'rows'])
+        runs = df.groupby(['run_id', 'engagement_id'], observed=True).agg(created_at=('created_at', 'min'), rows=('created_at', 'size'))
+        return runs.reset_index().sort_values('created_at').reset_index(drop=True)
+
+    def latest_run_id(self, engagement_id=None):
+        runs = self.list_runs(engagement_id)
+        return None if runs.empty else runs['run_id'].iloc[-1]
+
+    def load_run(self, run_id, columns=None):
+        """Loads one run; only the requested columns are read from disk."""
+        return self._scan(columns=columns, filters=[('run_id', '==', run_id)])
+
+    def load_run_rows(self, run_id):
+        """Full result dicts of a run (same shape as audit_results.json)."""
+        df = self.load_run(run_id, columns=['row_json'])
+        return [json.loads(row) for row in df['row_json']]
+
+    def compare_runs(self, run_a, run_b):
+        """Per-control verdict/score/answer changes between two runs (column scan, no row_json)."""
+        columns = ['control_reference', 'compliance_verdict', 'validation_score', 'ai_hash']
+        a = self.load_run(run_a, columns=columns).drop(columns=['run_id'], errors='ignore')
+        b = self.load_run(run_b, columns=columns).drop(columns=['run_id'], errors='ignore')
+        merged = pd.merge(a, b, on='control_reference', how='outer', suffixes=('_a', '_b'))
+        merged['verdict_changed'] = merged['compliance_verdict_a'] != merged['compliance_verdict_b']
+        merged['answer_changed'] = merged['ai_hash_a'] != merged['ai_hash_b']
+        merged['score_delta'] = merged['validation_score_b'] - merged['validation_score_a']
+        return merged
+
+    def verdict_trend(self, engagement_id=None):
+        """Verdict counts per run (columns: verdicts), for trend analysis across runs."""
+        filters = [('engagement_id', '==', engagement_id)] if engagement_id else None
+        df = self._scan(columns=['run_id', 'created_at', 'compliance_verdict'], filters=filters)
+        if df.empty:
+            return pd.DataFrame()
+        trend = df.pivot_table(index=['run_id', 'created_at'], columns='compliance_verdict', aggfunc='size', fill_value=0, observed=True)
+        return trend.sort_index(level='created_at')
+
+    # ---- Validation scores -------------------------------------------------
+
+    def load_scores(self):
+        if not os.path.exists(self.scores_path):
+            return pd.DataFrame(columns=SCORE_KEY + ['Semantic_Score', 'Lexical_Score', 'Comparison_Score'])
+        return pd.read_parquet(self.scores_path)
+
+    def save_scores(self, new_scores):
+        """Upserts scores keyed by (control, AI answer hash, expert answer hash, scoring version)."""
+        if new_scores.empty:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        scores = pd.concat([self.load_scores(), new_scores], ignore_index=True)
+        scores = scores.drop_duplicates(subset=SCORE_KEY, keep='last')
+        scores.to_parquet(self.scores_path, index=False)
+
+    # ---- Parsed CSV cache --------------------------------------------------
+
+    def read_csv_cached(self, path, **read_kwargs):
+        """pd.read_csv with a Parquet copy reused while the file (path, size, mtime) and options are unchanged."""
+        stat = os.stat(path)
+        key_source = json.dumps([os.path.abspath(path), stat.st_size, stat.st_mtime_ns, read_kwargs], sort_keys=True, default=str)
+        cache_file = os.path.join(self.csv_cache_path, hashlib.sha1(key_source.encode('utf-8')).hexdigest() + ".parquet")
+        if os.path.exists(cache_file):
+            return pd.read_parquet(cache_file)
+
+        df = pd.read_csv(path, **read_kwargs)
+        # Object columns can mix types in CSVs; store them as strings so Parquet accepts them
+        # (and so cached and fresh reads return identical frames).
+        df = df.astype({c: 'string' for c in df.columns if df[c].dtype == object})
+        try:
+            os.makedirs(self.csv_cache_path, exist_ok=True)
+            df.to_parquet(cache_file, index=False)
+        except Exception as e:
+            print(f"Warning: Could not cache parsed CSV {path}: {e}")
+        return df
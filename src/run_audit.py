@@ -1,14 +1,57 @@
+import argparse
+import io
 import os
 from config import CONFIG
 from rcm_engine import RcmAuditor
+from results_store import ResultsStore
+from index_manager import engagement_output_path
 import pandas as pd
 import json
+import time
 
-def main():
+def read_rcm_csv(source):
+    """Reads a ';'-separated RCM CSV from a path or raw bytes, trying UTF-8 then windows-1252."""
+    def open_source():
+        return io.BytesIO(source) if isinstance(source, bytes) else source
+
+    try:
+        # Try utf-8 first
+        return pd.read_csv(open_source(), sep=';', encoding='utf-8')
+    except UnicodeDecodeError:
+        print("UTF-8 decoding failed. Attempting with fallback encoding (windows-1252)...")
+        return pd.read_csv(open_source(), sep=';', encoding='windows-1252')
+
+def process_grouped(auditor, df, group_by):
+    """Runs the audit one Scope at a time (shared retrieval per group). Results keep the input row order."""
+    results = [None] * len(df)
+    # Rows without a group value are processed together under an empty key.
+    groups = df.groupby(df[group_by].fillna('') if group_by in df.columns else pd.Series('', index=df.index), sort=False)
+    total_groups = len(groups)
+
+    for group_num, (scope, group_df) in enumerate(groups, start=1):
+        print(f"Processing {group_by} {group_num}/{total_groups}: '{scope}' ({len(group_df)} rows)...")
+        positions = [df.index.get_loc(idx) for idx in group_df.index]
+        rows = [row.to_dict() for _, row in group_df.iterrows()]
+        try:
+            group_results = auditor.process_scope_group(rows)
+        except Exception as e:
+            # Errors in answering are caught per control; this is a failure of the shared retrieval.
+            print(f"Error retrieving context for {group_by} '{scope}': {e}")
+            group_results = [auditor.error_result(row_dict, e) for row_dict in rows]
+
+        for pos, res in zip(positions, group_results):
+            results[pos] = res
+
+        # Polite delay between groups to avoid hitting rate limits
+        time.sleep(1)
+
+    return results
+
+def main(engagement_id=None):
     print("Starting Audit Process...")
     
     # Initialize Auditor
-    auditor = RcmAuditor()
+    auditor = RcmAuditor(engagement_id=engagement_id)
     print("Initializing RAG Engine (this may take a moment)...")
     auditor.initialize_rag()
     
@@ -20,15 +63,7 @@ def main():
 
     print(f"Reading input from {input_csv}...")
     try:
-        # Try utf-8 first
-        df = pd.read_csv(input_csv, sep=';', encoding='utf-8')
-    except UnicodeDecodeError:
-        print("UTF-8 decoding failed. Attempting with fallback encoding (windows-1252)...")
-        try:
-            df = pd.read_csv(input_csv, sep=';', encoding='windows-1252')
-        except Exception as e:
-            print(f"Error reading CSV with fallback encoding: {e}")
-            return
+        df = read_rcm_csv(input_csv)
     except Exception as e:
         print(f"Error reading CSV: {e}")
         return
@@ -36,26 +71,29 @@ def main():
     results = []
     total_rows = len(df)
     print(f"Processing {total_rows} rows...")
-    
-    for idx, row in df.iterrows():
-        print(f"Processing row {idx + 1}/{total_rows}...")
-        try:
-            row_dict = row.to_dict()
-            res = auditor.process_row(row_dict)
-            results.append(res)
-        except Exception as e:
-            print(f"Error processing row {idx + 1}: {e}")
-            # Add error info to result
-            err_row = row.to_dict()
-            err_row['AI_Answer'] = f"Error: {e}"
-            results.append(err_row)
-            
-        # Polite delay between rows to avoid hitting rate limits
-        import time
-        time.sleep(1)
 
-    # Save Results
-    output_json = CONFIG['paths']['output_json']
+    group_settings = CONFIG.get('rag_settings', {}).get('grouped_retrieval', {})
+    if group_settings.get('enabled', False):
+        results = process_grouped(auditor, df, group_settings.get('group_by', 'Scope'))
+    else:
+        for idx, row in df.iterrows():
+            print(f"Processing row {idx + 1}/{total_rows}...")
+            try:
+                row_dict = row.to_dict()
+                res = auditor.process_row(row_dict)
+                results.append(res)
+            except Exception as e:
+                print(f"Error processing row {idx + 1}: {e}")
+                # Add error info to result
+                err_row = row.to_dict()
+                err_row['AI_Answer'] = f"Error: {e}"
+                results.append(err_row)
+
+            # Polite delay between rows to avoid hitting rate limits
+            time.sleep(1)
+
+    # Save Results (each engagement has its own file; the default engagement keeps audit_results.json)
+    output_json = engagement_output_path(CONFIG['paths']['output_json'], auditor.rag_engine.engagement_id)
     try:
         with open(output_json, 'w', encoding='utf-8') as f:
             json.dump(results, f, indent=4, ensure_ascii=False)
@@ -63,5 +101,19 @@ def main():
     except Exception as e:
         print(f"Error saving results: {e}")
 
+    # Keep the run in the columnar history (validation and cross-run comparisons read from it)
+    try:
+        ResultsStore(CONFIG['paths']['results_store']).write_run(results, engagement_id=auditor.rag_engine.engagement_id)
+    except Exception as e:
+        print(f"Error saving results to the results store: {e}")
+
+    query_cache = auditor.rag_engine.query_cache
+    if query_cache:
+        print(f"Semantic cache stats: {query_cache.stats()}")
+        query_cache.save()
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Run the RCM audit.")
+    parser.add_argument("--engagement", default=None, help="Engagement ID (client index under engagements/<id>/). Defaults to documents/.")
+    args = parser.parse_args()
+    main(engagement_id=args.engagement)
@@ -0,0 +1,166 @@
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticQueryCache:
+    """
+    In-memory semantic cache for retrieval results.
+
+    Incoming questions are embedded and compared (cosine similarity) against previously answered
+    questions for the same index version. Above `similarity_threshold` the stored documents are
+    returned and both HyDE and the vector search are skipped. Above `hyde_threshold`, the HyDE text
+    of an entry stored with a *different* k is reused (e.g. same question, different k); an entry
+    with the same k is never reused this way, as its search would return exactly its documents.
+    Entries are evicted LRU-first beyond `max_entries` and expire after `ttl_seconds`.
+    """
+
+    def __init__(self, similarity_threshold=0.95, hyde_threshold=None, max_entries=1024, ttl_seconds=None, persist_path=None):
+        self.similarity_threshold = similarity_threshold
+        self.hyde_threshold = hyde_threshold if hyde_threshold is not None else similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = persist_path
+
+        self._entries = OrderedDict() # entry_id -> entry dict, least recently used first
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'hyde_hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+        if persist_path:
+            self.load()
+
+    @classmethod
+    def from_config(cls, config):
+        """Builds the cache from the `semantic_cache` config section, or returns None when disabled."""
+        settings = config.get('semantic_cache', {})
+        if not settings.get('enabled', False):
+            return None
+        return cls(
+            similarity_threshold=settings.get('similarity_threshold', 0.95),
+            hyde_threshold=settings.get('hyde_threshold'),
+            max_entries=settings.get('max_entries', 1024),
+            ttl_seconds=settings.get('ttl_seconds'),
+            persist_path=config.get('paths', {}).get('semantic_cache_file'),
+        )
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _is_expired(self, entry, now):
+        return self.ttl_seconds is not None and now - entry['created'] > self.ttl_seconds
+
+    def _purge_expired(self, now):
+        expired = [entry_id for entry_id, entry in self._entries.items() if self._is_expired(entry, now)]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        self._stats['expirations'] += len(expired)
+
+    def _best_match(self, vector, index_version, k=None, exclude_k=None):
+        """
+        Returns (entry_id, similarity) of the most similar live entry for this index version,
+        restricted to entries stored with `k` (if given) and not with `exclude_k` (if given).
+        """
+        candidates = [
+            (entry_id, entry) for entry_id, entry in self._entries.items()
+            if entry['index_version'] == index_version
+            and (k is None or entry['k'] == k)
+            and (exclude_k is None or entry['k'] != exclude_k)
+        ]
+        if not candidates:
+            return None, 0.0
+        # Exact inner-product scan over unit vectors: cheap at cache sizes, no index rebuild on eviction.
+        matrix = np.stack([entry['vector'] for _, entry in candidates])
+        similarities = matrix @ vector
+        best = int(np.argmax(similarities))
+        return candidates[best][0], float(similarities[best])
+
+    def lookup(self, query_vector, index_version, k):
+        """
+        Returns a dict with 'documents' (full hit) or only 'search_query' (HyDE-only hit), or None on a miss.
+        """
+        vector = self._normalize(query_vector)
+        with self._lock:
+            self._purge_expired(time.time())
+
+            entry_id, similarity = self._best_match(vector, index_version, k)
+            if entry_id is not None and similarity >= self.similarity_threshold:
+                self._entries.move_to_end(entry_id)
+                self._stats['hits'] += 1
+                entry = self._entries[entry_id]
+                return {'documents': entry['documents'], 'search_query': entry['search_query'], 'similarity': similarity}
+
+            entry_id, similarity = self._best_match(vector, index_version, exclude_k=k)
+            if entry_id is not None and similarity >= self.hyde_threshold:
+                self._entries.move_to_end(entry_id)
+                self._stats['hyde_hits'] += 1
+                return {'search_query': self._entries[entry_id]['search_query'], 'similarity': similarity}
+
+            self._stats['misses'] += 1
+            return None
+
+    def store(self, query_vector, index_version, k, documents, search_query):
+        with self._lock:
+            self._entries[self._next_id] = {
+                'vector': self._normalize(query_vector),
+                'index_version': index_version,
+                'k': k,
+                'documents': documents,
+                'search_query': search_query,
+                'created': time.time(),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['hyde_hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def save(self):
+        """Persists entries so near-duplicate questions also hit across runs."""
+        if not self.persist_path:
+            return
+        with self._lock:
+            self._purge_expired(time.time())
+            payload = {'entries': list(self._entries.values()), 'next_id': self._next_id}
+        os.makedirs(os.path.dirname(self.persist_path) or ".", exist_ok=True)
+        with open(self.persist_path, "wb") as f:
+            pickle.dump(payload, f)
+        print(f"Semantic cache saved to {self.persist_path} ({len(payload['entries'])} entries).")
+
+    def load(self):
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, "rb") as f:
+                payload = pickle.load(f)
+        except Exception as e:
+            print(f"Warning: Could not load semantic cache from {self.persist_path}: {e}")
+            return
+        now = time.time()
+        with self._lock:
+            self._entries.clear()
+            for entry_id, entry in enumerate(payload.get('entries', [])):
+                if not self._is_expired(entry, now):
+                    self._entries[entry_id] = entry
+            self._next_id = len(payload.get('entries', []))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        print(f"Semantic cache loaded from {self.persist_path} ({len(self._entries)} entries).")
@@ -17,9 +17,10 @@ def test_optimization_verification():
     print("=== Phase 1: Persistent Vector Store Verification ===")
     
     # Ensure no index exists first
-    if os.path.exists("faiss_index_client"):
+    client_index = CONFIG['paths']['client_index']
+    if os.path.exists(client_index):
         print("Removing existing index for clean test...")
-        shutil.rmtree("faiss_index_client")
+        shutil.rmtree(client_index)
     
     # Re-init factory with new config provider (if necessary, though CONFIG is shared)
     from llm_factory import get_llm, get_embeddings
@@ -40,10 +41,13 @@ def test_optimization_verification():
     end_time = time.time()
     print(f"Time taken: {end_time - start_time:.2f} seconds")
     
-    assert os.path.exists("faiss_index_client"), "Index folder was not created!"
+    assert os.path.exists(client_index), "Index folder was not created!"
     
     # 2nd run - should load from disk
     print("\nRe-initializing Auditor to test loading from disk (2nd run)...")
+    # Drop the in-process copy so the 2nd run really loads from disk
+    from index_manager import get_index_manager
+    get_index_manager().evict(None)
     auditor_2 = RcmAuditor()
     start_time = time.time()
     auditor_2.initialize_rag()
@@ -3,23 +3,49 @@ import json
 import os
 import time
 from config import CONFIG
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-from deep_translator import GoogleTranslator
 import re
+import argparse
+from results_store import ResultsStore, content_hash
+from index_manager import DEFAULT_ENGAGEMENT, engagement_output_path, validate_engagement_id
 
-def validate_audit():
+# Identifies how Semantic/Lexical/Comparison scores are computed; bump it to invalidate cached scores.
+SCORING_VERSION = "translate-en|all-MiniLM-L6-v2|cosine80-jaccard20"
+
+def load_ai_results(store, run_id=None, engagement_id=DEFAULT_ENGAGEMENT):
+    """
+    Returns (run_id, results) from the results store. Without a run_id, the engagement's latest run
+    is used, unless the engagement's results JSON (audit_results.json, or audit_results_<id>.json)
+    is newer (e.g. written by the notebook): it is then imported as a new run.
+    """
+    if run_id:
+        print(f"Loading AI results from results store (run {run_id})...", flush=True)
+        return run_id, store.load_run_rows(run_id)
+
+    output_json = engagement_output_path(CONFIG['paths']['output_json'], engagement_id)
+    runs = store.list_runs(engagement_id)
+    latest_run_time = runs['created_at'].iloc[-1].timestamp() if not runs.empty else None
+    if os.path.exists(output_json) and (latest_run_time is None or os.path.getmtime(output_json) > latest_run_time):
+        print(f"Loading AI results from {output_json}...", flush=True)
+        with open(output_json, 'r', encoding='utf-8') as f:
+            ai_results = json.load(f)
+        return store.write_run(ai_results, engagement_id=engagement_id), ai_results
+
+    if runs.empty:
+        return None, None
+    run_id = runs['run_id'].iloc[-1]
+    print(f"Loading AI results from results store (run {run_id})...", flush=True)
+    return run_id, store.load_run_rows(run_id)
+
+def validate_audit(run_id=None, engagement_id=None):
     print("Starting Validation Process...", flush=True)
+    store = ResultsStore(CONFIG['paths']['results_store'])
+    engagement_id = validate_engagement_id(engagement_id)
 
     # 1. Load AI Results
-    output_json = CONFIG['paths']['output_json']
-    if not os.path.exists(output_json):
-        print(f"Error: {output_json} not found. Run the audit first.", flush=True)
+    run_id, ai_results = load_ai_results(store, run_id, engagement_id)
+    if ai_results is None:
+        print(f"Error: No audit results found for engagement '{engagement_id}' ({engagement_output_path(CONFIG['paths']['output_json'], engagement_id)} or results store). Run the audit first.", flush=True)
         return
-
-    print(f"Loading AI results from {output_json}...", flush=True)
-    with open(output_json, 'r', encoding='utf-8') as f:
-        ai_results = json.load(f)
     
     df_ai = pd.DataFrame(ai_results)
     
@@ -38,8 +64,8 @@ def validate_audit():
 
     print(f"Loading Expert answers from {expert_csv}...", flush=True)
     try:
-        # Based on inspection, separator is ';'
-        df_expert = pd.read_csv(expert_csv, sep=';', encoding='latin-1') 
+        # Based on inspection, separator is ';'. Parsed once, then reused while the file is unchanged.
+        df_expert = store.read_csv_cached(expert_csv, sep=';', encoding='latin-1')
     except Exception as e:
         print(f"Error reading expert CSV: {e}", flush=True)
         return
@@ -61,22 +87,39 @@ def validate_audit():
     
     print(f"Merged {len(merged_df)} rows (Intersection of AI and Expert data).", flush=True)
 
-    print("Loading Sentence Transformer model (this may take a moment)...", flush=True)
-    try:
-        model = SentenceTransformer('all-MiniLM-L6-v2')
-    except Exception as e:
-        print(f"Error initializing SentenceTransformer: {e}", flush=True)
-        return
+    # 4. Reuse scores of rows whose AI and expert answers are unchanged since they were last scored
+    merged_df['ai_hash'] = merged_df['AI_Answer'].map(content_hash)
+    merged_df['expert_hash'] = merged_df['Answers based on Clients data'].map(content_hash)
 
-    print("Initializing Google Translator...", flush=True)
-    translator = GoogleTranslator(source='auto', target='en')
+    cached = store.load_scores()
+    cached = cached[cached['scoring_version'] == SCORING_VERSION]
+    cached = cached.rename(columns={'control_reference': 'Control Reference'}).drop(columns=['scoring_version'])
+    cached = cached.drop_duplicates(subset=['Control Reference', 'ai_hash', 'expert_hash'], keep='last')
+    merged_df = pd.merge(merged_df, cached, on=['Control Reference', 'ai_hash', 'expert_hash'], how='left')
 
-    print("Calculating similarity metrics...", flush=True)
-    
-    # Initialize metrics columns
-    merged_df['Semantic_Score'] = 0.0
-    merged_df['Lexical_Score'] = 0.0
-    merged_df['Comparison_Score'] = 0.0
+    pending = merged_df.index[merged_df['Comparison_Score'].isna()]
+    print(f"{len(merged_df) - len(pending)} rows unchanged (cached scores), {len(pending)} rows to score.", flush=True)
+
+    output_path = CONFIG['paths']['validation_report_csv']
+    report_columns = [c for c in merged_df.columns if c not in ('ai_hash', 'expert_hash')]
+
+    if len(pending):
+        # Heavy imports only when something actually needs scoring
+        from sentence_transformers import SentenceTransformer
+        from sklearn.metrics.pairwise import cosine_similarity
+        from deep_translator import GoogleTranslator
+
+        print("Loading Sentence Transformer model (this may take a moment)...", flush=True)
+        try:
+            model = SentenceTransformer('all-MiniLM-L6-v2')
+        except Exception as e:
+            print(f"Error initializing SentenceTransformer: {e}", flush=True)
+            return
+
+        print("Initializing Google Translator...", flush=True)
+        translator = GoogleTranslator(source='auto', target='en')
+
+        print("Calculating similarity metrics...", flush=True)
 
     def jaccard_similarity(str1, str2):
         set1 = set(re.findall(r'\w+', str1.lower()))
@@ -84,11 +127,10 @@ def validate_audit():
         if not set1 or not set2:
             return 0.0
         return float(len(set1.intersection(set2)) / len(set1.union(set2)))
-    
-    output_path = CONFIG['paths']['validation_report_csv']
 
-    
-    for idx, row in merged_df.iterrows():
+    new_scores = []
+    for count, idx in enumerate(pending, start=1):
+        row = merged_df.loc[idx]
         question = row.get('Design Effectiveness Assessment', 'N/A')
         ai_ans = row.get('AI_Answer', 'N/A')
         expert_ans = row.get('Answers based on Clients data', 'N/A')
@@ -122,14 +164,29 @@ def validate_audit():
         merged_df.at[idx, 'Semantic_Score'] = semantic_score
         merged_df.at[idx, 'Lexical_Score'] = lexical_score
         merged_df.at[idx, 'Comparison_Score'] = final_score
+        new_scores.append({
+            'control_reference': row['Control Reference'],
+            'ai_hash': row['ai_hash'],
+            'expert_hash': row['expert_hash'],
+            'scoring_version': SCORING_VERSION,
+            'Semantic_Score': semantic_score,
+            'Lexical_Score': lexical_score,
+            'Comparison_Score': final_score,
+        })
         
-        if (idx + 1) % 5 == 0:
-            print(f"Processed {idx + 1}/{len(merged_df)}...", flush=True)
-            merged_df.to_csv(output_path, index=False, encoding='utf-8-sig', sep=';')
+        if count % 5 == 0:
+            print(f"Processed {count}/{len(pending)}...", flush=True)
+            merged_df[report_columns].to_csv(output_path, index=False, encoding='utf-8-sig', sep=';')
+            store.save_scores(pd.DataFrame(new_scores))
             time.sleep(1) # Polite delay
-            
-    merged_df.to_csv(output_path, index=False, encoding='utf-8-sig', sep=';')
-    print(f"Validation complete. Report saved to {output_path}", flush=True)
+
+    store.save_scores(pd.DataFrame(new_scores))
+    merged_df[report_columns].to_csv(output_path, index=False, encoding='utf-8-sig', sep=';')
+    print(f"Validation complete (run {run_id}). Report saved to {output_path}", flush=True)
 
 if __name__ == "__main__":
-    validate_audit()
+    parser = argparse.ArgumentParser(description="Compare AI answers against expert answers.")
+    parser.add_argument("--run-id", default=None, help="Results store run to validate. Defaults to the engagement's latest run.")
+    parser.add_argument("--engagement", default=None, help="Engagement whose latest run is validated. Defaults to the default engagement.")
+    args = parser.parse_args()
+    validate_audit(run_id=args.run_id, engagement_id=args.engagement)
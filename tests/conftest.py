@@ -0,0 +1,43 @@
+"""Shared test setup: `src/` on the import path and an offline, temp-dir configuration."""
+import copy
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from config import CONFIG, PROJECT_ROOT  # noqa: E402
+
+
+@pytest.fixture
+def fake_config(monkeypatch):
+    """CONFIG with the offline `fake` LLM and embeddings and no semantic cache (restored after the test)."""
+    monkeypatch.setitem(CONFIG, 'llm_settings', {'provider': 'fake', 'temperature': 0.0})
+    monkeypatch.setitem(CONFIG, 'embedding_settings', {'provider': None})
+    monkeypatch.setitem(CONFIG, 'semantic_cache', {'enabled': False})
+    return CONFIG
+
+
+@pytest.fixture
+def tmp_paths(tmp_path, fake_config, monkeypatch):
+    """Points every index, database and output path at `tmp_path`; client documents are the repo's `documents/`."""
+    regulations = tmp_path / "regulations"
+    regulations.mkdir()
+    paths = copy.deepcopy(CONFIG.get('paths', {}))
+    paths.update({
+        'documents_folder': str(PROJECT_ROOT / "documents"),
+        'client_index': str(tmp_path / "faiss_index_client"),
+        'regulations_folder': str(regulations), # empty: client evidence only, keeps the tests fast
+        'regulations_index': str(tmp_path / "faiss_index_regs"),
+        'engagements_folder': str(tmp_path / "engagements"),
+        'results_store': str(tmp_path / "results_store"),
+        'jobs_db': str(tmp_path / "audit_jobs.db"),
+        'output_json': str(tmp_path / "audit_results.json"),
+        'client_summary': str(tmp_path / "client_summary.md"),
+        'client_summary_cache': str(tmp_path / "client_summary_cache.json"),
+        'semantic_cache_file': str(tmp_path / "semantic_cache.pkl"),
+        'validation_report_csv': str(tmp_path / "validation_comparison_report.csv"),
+    })
+    monkeypatch.setitem(CONFIG, 'paths', paths)
+    return paths
@@ -0,0 +1,109 @@
+"""End-to-end test of the audit service with the offline `fake` provider."""
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from config import PROJECT_ROOT
+from index_manager import IndexManager
+from audit_service import AuditService, JobStore, make_server
+from rcm_engine import RcmAuditor
+
+
+@pytest.fixture
+def service_url(tmp_paths):
+    service = AuditService(JobStore(tmp_paths['jobs_db']), max_workers=4, poll_interval=0.05, index_manager=IndexManager())
+    service.start()
+    server = make_server(service, "127.0.0.1", 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    service.stop()
+
+
+def request(url, data=None):
+    with urllib.request.urlopen(urllib.request.Request(url, data=data), timeout=120) as response:
+        return response.status, response.read().decode('utf-8')
+
+
+def stream_results(base_url, job_id):
+    _, body = request(f"{base_url}/jobs/{job_id}/results")
+    return [json.loads(line) for line in body.splitlines() if line.strip()]
+
+
+def test_control_and_rcm_jobs_stream_results(service_url):
+    row = {'Control Reference': 'T-1', 'Design Effectiveness Assessment': 'Is there a formal IFRS 9 policy?'}
+    status, body = request(f"{service_url}/jobs/control", json.dumps({'row': row}).encode('utf-8'))
+    assert status == 202
+    control_job = json.loads(body)['job_id']
+
+    results = stream_results(service_url, control_job)
+    assert len(results) == 1
+    assert results[0]['result']['Control Reference'] == 'T-1'
+    assert results[0]['result']['Compliance_Verdict'] == 'Insufficient Info'
+    assert json.loads(request(f"{service_url}/jobs/{control_job}")[1])['status'] == 'completed'
+
+    with open(PROJECT_ROOT / "inputs" / "rcm_input.csv", "rb") as f:
+        csv_bytes = f.read()
+    status, body = request(f"{service_url}/jobs/rcm", csv_bytes)
+    assert status == 202
+    rcm_job = json.loads(body)['job_id']
+
+    results = stream_results(service_url, rcm_job)
+    job = json.loads(request(f"{service_url}/jobs/{rcm_job}")[1])
+    assert job['status'] == 'completed'
+    assert len(results) == job['total_rows'] == job['completed_rows'] > 1
+    assert sorted(r['row_index'] for r in results) == list(range(job['total_rows']))
+    assert all(not str(r['result']['AI_Answer']).startswith("Error") for r in results)
+
+
+def test_invalid_engagement_is_rejected(service_url):
+    payload = json.dumps({'row': {'Control Reference': 'T-2'}, 'engagement_id': '../../escape'}).encode('utf-8')
+    with pytest.raises(urllib.error.HTTPError) as error:
+        request(f"{service_url}/jobs/control", payload)
+    assert error.value.code == 400
+
+
+def test_unknown_engagement_fails_job(service_url):
+    payload = json.dumps({'row': {'Control Reference': 'T-3'}, 'engagement_id': 'no_such_bank'}).encode('utf-8')
+    job_id = json.loads(request(f"{service_url}/jobs/control", payload)[1])['job_id']
+
+    assert stream_results(service_url, job_id) == []
+    job = json.loads(request(f"{service_url}/jobs/{job_id}")[1])
+    assert job['status'] == 'failed'
+    assert 'no_such_bank' in job['error']
+
+
+def test_warming_up_an_engagement_does_not_block_others(tmp_paths, monkeypatch):
+    service = AuditService(JobStore(tmp_paths['jobs_db']), index_manager=IndexManager())
+    default_auditor = service.get_auditor(None)
+
+    release = threading.Event()
+    warming = threading.Event()
+    real_initialize = RcmAuditor.initialize_rag
+
+    def slow_initialize(auditor):
+        if auditor.rag_engine.engagement_id == "bank_a":
+            warming.set()
+            release.wait(timeout=30) # e.g. a first index build
+        real_initialize(auditor)
+
+    monkeypatch.setattr(RcmAuditor, "initialize_rag", slow_initialize)
+    monkeypatch.setattr(service.index_manager, "get_client_store", lambda engagement_id=None: None)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(service.get_auditor, "bank_a")
+        second = executor.submit(service.get_auditor, "bank_a")
+        assert warming.wait(timeout=30)
+
+        started = time.monotonic()
+        assert service.get_auditor(None) is default_auditor
+        assert time.monotonic() - started < 1
+
+        release.set()
+        assert first.result() is second.result()
@@ -0,0 +1,92 @@
+"""Map-reduce client summary: per-topic cache reuse and invalidation."""
+import random
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.documents import Document
+
+from config import CONFIG
+from index_manager import IndexManager
+from rcm_engine import CLIENT_SUMMARY_TOPICS, RcmAuditor
+
+
+class StubRagEngine:
+    """Same chunks for every topic, returned in a different order on each call (like HyDE-driven retrieval)."""
+
+    engagement_id = "default"
+
+    def __init__(self):
+        self.version = "v1"
+        self.docs = [Document(page_content=f"Policy text {n}", metadata={'source': 'policy.pdf', 'page': n}) for n in range(5)]
+
+    def build_index(self):
+        pass
+
+    def ingest_regulations(self):
+        pass
+
+    def index_version(self):
+        return self.version
+
+    def retrieve(self, query, k):
+        docs = self.docs[:k]
+        return random.sample(docs, len(docs))
+
+
+class CountingLLM:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        return SimpleNamespace(content=f"Section {self.calls}")
+
+
+@pytest.fixture
+def auditor(tmp_paths, monkeypatch):
+    monkeypatch.setitem(CONFIG, 'summary_settings', {'mode': 'map_reduce', 'max_workers': 4, 'topic_k': 4})
+
+    auditor = RcmAuditor(index_manager=IndexManager())
+    auditor.rag_engine = StubRagEngine()
+    auditor.llm = CountingLLM()
+    return auditor
+
+
+def test_topic_cache(auditor, monkeypatch):
+    topics = len(CLIENT_SUMMARY_TOPICS)
+    auditor.generate_client_summary_map_reduce()
+    assert auditor.llm.calls == topics
+
+    # Same index version: reused without retrieval.
+    auditor.generate_client_summary_map_reduce()
+    assert auditor.llm.calls == topics
+
+    # Rebuilt index, same chunks in another order: reused after retrieval.
+    auditor.rag_engine.version = "v2"
+    auditor.generate_client_summary_map_reduce()
+    assert auditor.llm.calls == topics
+
+    # Changed chunks: regenerated.
+    auditor.rag_engine.version = "v3"
+    auditor.rag_engine.docs[0] = Document(page_content="Revised policy text", metadata={'source': 'policy.pdf', 'page': 0})
+    auditor.generate_client_summary_map_reduce()
+    assert auditor.llm.calls == 2 * topics
+
+    # Different topic_k with the same index version: regenerated.
+    monkeypatch.setitem(CONFIG, 'summary_settings', {'mode': 'map_reduce', 'max_workers': 4, 'topic_k': 3})
+    auditor.generate_client_summary_map_reduce()
+    assert auditor.llm.calls == 3 * topics
+
+
+def test_stream_yields_the_map_reduce_document(auditor):
+    streamed = list(auditor.stream_client_summary())
+
+    assert len(streamed) == len(CLIENT_SUMMARY_TOPICS)
+    assert streamed[0].startswith(f"## 1. {CLIENT_SUMMARY_TOPICS[0][0]}")
+    with open(auditor.client_summary_path(), encoding="utf-8") as f:
+        assert f.read() == "".join(streamed) + "\n"
+
+    # Streaming fills and uses the same topic cache as generate_client_summary.
+    calls = auditor.llm.calls
+    assert auditor.generate_client_summary() == "".join(streamed)
+    assert auditor.llm.calls == calls
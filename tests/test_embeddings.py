@@ -0,0 +1,116 @@
+"""Embedding namespaces (index paths per model) and the local sentence-transformer wrapper."""
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from config import CONFIG
+from index_manager import IndexManager
+from llm_factory import get_embedding_namespace
+from local_embeddings import LocalSentenceTransformerEmbeddings
+
+
+@pytest.mark.parametrize("config, namespace", [
+    ({'llm_settings': {'provider': 'openai'}}, ""),
+    ({'llm_settings': {'provider': 'google'}}, "google"),
+    ({'llm_settings': {'provider': 'fake'}}, "fake"),
+    ({'llm_settings': {'provider': 'openai'}, 'embedding_settings': {'provider': 'Google'}}, "google"),
+    ({'llm_settings': {'provider': 'openai'}, 'embedding_settings': {'provider': 'local'}}, "local-paraphrase-multilingual-minilm-l12-v2"),
+    ({'embedding_settings': {'provider': 'local', 'local': {'model': 'intfloat/multilingual-e5_small (v2)'}}}, "local-multilingual-e5-small-v2"),
+])
+def test_embedding_namespace(config, namespace):
+    assert get_embedding_namespace(config) == namespace
+
+
+def test_index_paths_are_namespaced(tmp_paths, monkeypatch):
+    documents, client_index = IndexManager(embeddings=object(), namespace="local-minilm").client_paths()
+    assert documents == tmp_paths['documents_folder']
+    assert client_index == tmp_paths['client_index'] + "__local-minilm"
+
+    _, client_index = IndexManager(embeddings=object(), namespace="local-minilm").client_paths("bank_a")
+    assert client_index.endswith("bank_a/faiss_index_client__local-minilm")
+
+    # OpenAI keeps the original folders; hierarchical indexes get their own suffix.
+    manager = IndexManager(embeddings=object(), namespace="")
+    assert manager.client_paths()[1] == tmp_paths['client_index']
+    assert manager.index_path_regs == tmp_paths['regulations_index']
+    monkeypatch.setitem(CONFIG, 'rag_settings', {'index_mode': 'hierarchical'})
+    manager = IndexManager(embeddings=object(), namespace="google")
+    assert manager.client_paths()[1] == tmp_paths['client_index'] + "__google__hier"
+
+
+class StubModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, batch_size, normalize_embeddings, show_progress_bar):
+        self.calls.append(('encode', len(texts), batch_size))
+        return np.ones((len(texts), 3))
+
+    def start_multi_process_pool(self, target_devices):
+        self.calls.append(('start_pool', len(target_devices)))
+        return "pool"
+
+    def encode_multi_process(self, texts, pool, batch_size, normalize_embeddings):
+        self.calls.append(('encode_multi_process', len(texts), pool))
+        return np.ones((len(texts), 3))
+
+    def stop_multi_process_pool(self, pool):
+        self.calls.append(('stop_pool', pool))
+
+
+def local_embeddings(**kwargs):
+    embeddings = LocalSentenceTransformerEmbeddings("stub-model", batch_size=8, multi_process_threshold=5, **kwargs)
+    embeddings._model = StubModel()
+    return embeddings
+
+
+def test_small_batches_encode_in_process():
+    embeddings = local_embeddings(processes=4)
+    assert embeddings.embed_documents(["a", "b"]) == [[1.0, 1.0, 1.0]] * 2
+    assert embeddings.embed_query("q") == [1.0, 1.0, 1.0]
+    assert embeddings.embed_documents([]) == []
+    assert embeddings.model.calls == [('encode', 2, 8), ('encode', 1, 1)]
+
+
+def test_large_batches_use_a_process_pool():
+    embeddings = local_embeddings(processes=4)
+    assert len(embeddings.embed_documents([str(i) for i in range(6)])) == 6
+    assert embeddings.model.calls == [('start_pool', 4), ('encode_multi_process', 6, "pool"), ('stop_pool', "pool")]
+
+
+def test_single_process_never_starts_a_pool():
+    embeddings = local_embeddings(processes=1)
+    embeddings.embed_documents([str(i) for i in range(6)])
+    assert embeddings.model.calls == [('encode', 6, 8)]
+
+
+@pytest.fixture
+def sentence_transformer(monkeypatch):
+    """Records how SentenceTransformer is constructed; ONNX loading can be made to fail."""
+    created = []
+
+    class SentenceTransformer:
+        fail_onnx = False
+
+        def __init__(self, name, device, backend="torch", model_kwargs=None):
+            if backend == "onnx" and SentenceTransformer.fail_onnx:
+                raise ImportError("optimum not installed")
+            created.append((name, device, backend, model_kwargs))
+
+    monkeypatch.setitem(sys.modules, "sentence_transformers", types.SimpleNamespace(SentenceTransformer=SentenceTransformer))
+    return SentenceTransformer, created
+
+
+def test_onnx_backend_loads_the_configured_file(sentence_transformer):
+    _, created = sentence_transformer
+    LocalSentenceTransformerEmbeddings("m", backend="onnx", onnx_file="onnx/model_qint8_avx512.onnx").model
+    assert created == [("m", "cpu", "onnx", {"file_name": "onnx/model_qint8_avx512.onnx"})]
+
+
+def test_onnx_backend_falls_back_to_torch(sentence_transformer):
+    cls, created = sentence_transformer
+    cls.fail_onnx = True
+    LocalSentenceTransformerEmbeddings("m", backend="onnx").model
+    assert created == [("m", "cpu", "torch", None)]
@@ -0,0 +1,30 @@
+"""Hierarchical index: parents beyond `full_text_parents` are returned as their summary."""
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from hierarchical_index import HierarchicalStore, build_parents_and_children
+from rcm_engine import RcmAuditor
+
+
+def test_lower_ranked_parents_are_summaries():
+    pages = [
+        Document(page_content=f"Section {n} opening sentence. " + "Detail text. " * 40, metadata={'source': 'policy.pdf', 'page': n})
+        for n in range(4)
+    ]
+    parents, children = build_parents_and_children(pages, child_chunk_size=200, child_chunk_overlap=0, summary_chars=60)
+    vector_store = FAISS.from_documents(children, DeterministicFakeEmbedding(size=32))
+    store = HierarchicalStore(vector_store, parents, child_k=50, max_parents=4, full_text_parents=2)
+
+    docs = store.similarity_search("opening sentence", k=4)
+
+    assert len(docs) == 4
+    assert [d.metadata['content_type'] for d in docs] == ['full_text', 'full_text', 'summary', 'summary']
+    for doc in docs[:2]:
+        assert doc.page_content == parents[doc.metadata['parent_id']]['text']
+    for doc in docs[2:]:
+        assert doc.page_content == doc.metadata['summary'] == parents[doc.metadata['parent_id']]['summary']
+
+    context_text, evidence_used = RcmAuditor.format_context(docs)
+    assert context_text.count("(section summary)") == 2
+    assert len(evidence_used) == 4
@@ -0,0 +1,84 @@
+"""IndexManager: engagement LRU under the memory cap."""
+import gc
+import shutil
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from config import PROJECT_ROOT
+from index_manager import IndexManager, engagement_output_path
+from rag_engine import RagEngine
+
+SAMPLE_PDF = "Respuesta Memorando final Inspección 2025_Perdida Esperada NIIF.pdf"
+
+
+@pytest.fixture
+def engagements(tmp_paths):
+    """Two engagements with the same (small) client document."""
+    for engagement_id in ("bank_a", "bank_b"):
+        documents = Path(tmp_paths["engagements_folder"]) / engagement_id / "documents"
+        documents.mkdir(parents=True)
+        shutil.copy(PROJECT_ROOT / "documents" / SAMPLE_PDF, documents / SAMPLE_PDF)
+    return ["bank_a", "bank_b"]
+
+
+def test_evicted_client_index_is_released(engagements):
+    manager = IndexManager(max_client_index_mb=0) # keeps only the most recently used engagement
+    engine_a = RagEngine("bank_a", index_manager=manager)
+    engine_b = RagEngine("bank_b", index_manager=manager)
+
+    assert engine_a.retrieve("provisioning policy", k=2)
+    store_a = weakref.ref(manager.get_client_store("bank_a"))
+
+    assert engine_b.retrieve("provisioning policy", k=2)
+    assert manager.loaded_engagements() == ["bank_b"]
+    gc.collect()
+    # The engine of bank_a is still alive, but no longer pins its index in memory.
+    assert store_a() is None
+    assert engine_a.retrieve("provisioning policy", k=2)
+    assert manager.loaded_engagements() == ["bank_a"]
+
+
+def test_unknown_engagement_raises(tmp_paths):
+    with pytest.raises(FileNotFoundError):
+        IndexManager().get_client_store("no_such_bank")
+
+
+def test_build_does_not_block_loaded_engagements(engagements, monkeypatch):
+    manager = IndexManager()
+    manager.get_client_store("bank_a")
+
+    real_build = manager.build_or_load_index
+    release = threading.Event()
+    builds = []
+
+    def slow_build(index_name, folder_path):
+        builds.append(index_name)
+        release.wait(timeout=30) # e.g. a throttled remote-embedding build
+        return real_build(index_name, folder_path)
+
+    monkeypatch.setattr(manager, "build_or_load_index", slow_build)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(manager.get_client_store, "bank_b")
+        second = executor.submit(manager.get_client_store, "bank_b")
+        while not builds:
+            time.sleep(0.01)
+
+        started = time.monotonic()
+        assert manager.get_client_store("bank_a") is not None
+        assert time.monotonic() - started < 1
+
+        release.set()
+        assert first.result() is second.result() is not None
+    assert len(builds) == 1
+
+
+def test_engagement_output_path():
+    assert engagement_output_path("outputs/audit_results.json") == "outputs/audit_results.json"
+    assert engagement_output_path("outputs/audit_results.json", "bank_a") == "outputs/audit_results_bank_a.json"
+    with pytest.raises(ValueError):
+        engagement_output_path("outputs/audit_results.json", "../x")
@@ -0,0 +1,142 @@
+"""ResultsStore runs and the incremental validation path of validate_audit."""
+import json
+import os
+import sys
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import validate_audit
+from results_store import ResultsStore, content_hash
+
+
+def result(ref, answer, verdict="Compliant", score=8):
+    return {'Control Reference': ref, 'AI_Answer': answer, 'Compliance_Verdict': verdict, 'Validation_Score': score}
+
+
+def test_write_list_and_compare_runs(tmp_path):
+    store = ResultsStore(str(tmp_path / "store"))
+    run_a = store.write_run([result("C1", "yes"), result(" C2 ", "no", "Non-Compliant", 3)], run_id="run-a")
+    run_b = store.write_run([result("C1", "yes, updated", "Partial", 6), result("C2", "no", "Non-Compliant", 3)], run_id="run-b")
+    store.write_run([result("C1", "other bank")], run_id="run-x", engagement_id="bank_a")
+
+    runs = store.list_runs()
+    assert list(runs['run_id']) == ["run-a", "run-b", "run-x"]
+    assert list(store.list_runs("default")['run_id']) == ["run-a", "run-b"]
+    assert list(store.list_runs("bank_a")['rows']) == [1]
+    assert store.latest_run_id("default") == "run-b"
+    assert store.load_run_rows(run_a)[1]['Control Reference'] == " C2 "
+
+    diff = store.compare_runs(run_a, run_b).set_index('control_reference')
+    assert diff.loc["C1", 'verdict_changed'] and diff.loc["C1", 'answer_changed']
+    assert diff.loc["C1", 'score_delta'] == -2
+    assert not diff.loc["C2", 'verdict_changed'] and not diff.loc["C2", 'answer_changed']
+
+
+@pytest.fixture
+def scorer(monkeypatch):
+    """Stands in for the lazily imported scoring libraries; counts the answers that get embedded."""
+    encoded = []
+
+    class SentenceTransformer:
+        def __init__(self, name):
+            pass
+
+        def encode(self, texts):
+            encoded.extend(texts)
+            return np.array([[1.0, float(len(text))] for text in texts])
+
+    class GoogleTranslator:
+        def __init__(self, source, target):
+            pass
+
+        def translate(self, text):
+            return text
+
+    def cosine_similarity(a, b):
+        a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+        return (a @ b.T) / (np.linalg.norm(a) * np.linalg.norm(b))
+
+    pairwise = types.ModuleType("sklearn.metrics.pairwise")
+    pairwise.cosine_similarity = cosine_similarity
+    monkeypatch.setitem(sys.modules, "sentence_transformers", types.SimpleNamespace(SentenceTransformer=SentenceTransformer))
+    monkeypatch.setitem(sys.modules, "deep_translator", types.SimpleNamespace(GoogleTranslator=GoogleTranslator))
+    monkeypatch.setitem(sys.modules, "sklearn", types.ModuleType("sklearn"))
+    monkeypatch.setitem(sys.modules, "sklearn.metrics", types.ModuleType("sklearn.metrics"))
+    monkeypatch.setitem(sys.modules, "sklearn.metrics.pairwise", pairwise)
+    return encoded
+
+
+@pytest.fixture
+def expert_csv(tmp_paths):
+    path = os.path.join(os.path.dirname(tmp_paths['results_store']), "expert.csv")
+    pd.DataFrame({
+        'Control Reference': ["C1", "C2", "C3"],
+        'Answers based on Clients data': ["expert one", "expert two", "expert three"],
+    }).to_csv(path, sep=';', index=False, encoding='latin-1')
+    tmp_paths['expert_answers_csv'] = path
+    return path
+
+
+def write_json(path, results, mtime=None):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def test_scores_are_reused_per_control_answer_and_version(tmp_paths, expert_csv, scorer, monkeypatch):
+    store = ResultsStore(tmp_paths['results_store'])
+    store.write_run([result("C1", "one"), result("C2", "two"), result("C3", "three")], run_id="run-1")
+
+    validate_audit.validate_audit()
+    assert len(scorer) == 6 # 3 rows x (AI + expert answer)
+    report = pd.read_csv(tmp_paths['validation_report_csv'], sep=';')
+    assert report['Comparison_Score'].notna().all()
+
+    scorer.clear()
+    validate_audit.validate_audit()
+    assert scorer == []
+
+    # Only the control whose AI answer changed is scored again.
+    store.write_run([result("C1", "one"), result("C2", "two, revised"), result("C3", "three")], run_id="run-2")
+    validate_audit.validate_audit()
+    assert scorer == ["two, revised", "expert two"]
+
+    scores = store.load_scores()
+    assert set(scores.loc[scores['control_reference'] == "C2", 'ai_hash']) == {content_hash("two"), content_hash("two, revised")}
+
+    # A new scoring version invalidates every cached score.
+    scorer.clear()
+    monkeypatch.setattr(validate_audit, "SCORING_VERSION", "test-version")
+    validate_audit.validate_audit()
+    assert len(scorer) == 6
+
+
+def test_results_json_is_imported_only_when_newer(tmp_paths):
+    store = ResultsStore(tmp_paths['results_store'])
+    output_json = tmp_paths['output_json']
+
+    write_json(output_json, [result("C1", "from json")])
+    run_id, rows = validate_audit.load_ai_results(store)
+    assert rows[0]['AI_Answer'] == "from json"
+    assert list(store.list_runs()['run_id']) == [run_id]
+
+    # Older than the imported run: the stored run is used, nothing new is imported.
+    write_json(output_json, [result("C1", "stale")], mtime=store.list_runs()['created_at'].iloc[-1].timestamp() - 60)
+    assert validate_audit.load_ai_results(store) == (run_id, rows)
+    assert len(store.list_runs()) == 1
+
+    # Newer (e.g. rewritten by the notebook): imported as a new run.
+    write_json(output_json, [result("C1", "fresh")], mtime=store.list_runs()['created_at'].iloc[-1].timestamp() + 60)
+    new_run_id, rows = validate_audit.load_ai_results(store)
+    assert new_run_id != run_id and rows[0]['AI_Answer'] == "fresh"
+
+    # Other engagements use their own JSON and runs.
+    assert validate_audit.load_ai_results(store, engagement_id="bank_a") == (None, None)
+    write_json(output_json.replace(".json", "_bank_a.json"), [result("C9", "bank a")])
+    bank_run, rows = validate_audit.load_ai_results(store, engagement_id="bank_a")
+    assert rows[0]['Control Reference'] == "C9"
+    assert list(store.list_runs("bank_a")['run_id']) == [bank_run]
@@ -0,0 +1,96 @@
+"""SemanticQueryCache: threshold and k matching, index versions, LRU, TTL and persistence."""
+import math
+
+from semantic_cache import SemanticQueryCache
+
+
+def vector_at(similarity):
+    """Unit vector whose cosine similarity with [1, 0] is `similarity`."""
+    return [similarity, math.sqrt(1 - similarity ** 2)]
+
+
+BASE = [1.0, 0.0]
+
+
+def make_cache(**kwargs):
+    settings = {'similarity_threshold': 0.95, 'hyde_threshold': 0.92}
+    settings.update(kwargs)
+    return SemanticQueryCache(**settings)
+
+
+def test_full_hit_requires_threshold_and_same_k():
+    cache = make_cache()
+    cache.store(BASE, "v1", 10, ["docA"], "hydeA")
+
+    hit = cache.lookup(vector_at(0.97), "v1", 10)
+    assert hit['documents'] == ["docA"] and hit['search_query'] == "hydeA"
+    assert cache.lookup(vector_at(0.93), "v1", 10) is None # below similarity_threshold, same k: miss
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_hyde_hit_only_for_a_different_k():
+    cache = make_cache()
+    cache.store(BASE, "v1", 10, ["docA"], "hydeA")
+
+    hit = cache.lookup(vector_at(0.93), "v1", 15)
+    assert hit == {'search_query': "hydeA", 'similarity': hit['similarity']}
+    hit = cache.lookup(vector_at(0.97), "v1", 15)
+    assert 'documents' not in hit and hit['search_query'] == "hydeA"
+    assert cache.lookup(vector_at(0.90), "v1", 15) is None
+    assert cache.stats()['hyde_hits'] == 2
+
+
+def test_entries_are_isolated_by_index_version():
+    cache = make_cache()
+    cache.store(BASE, "v1", 10, ["docA"], "hydeA")
+
+    assert cache.lookup(BASE, "v2", 10) is None
+    assert cache.lookup(BASE, "v2", 15) is None
+    assert cache.lookup(BASE, "v1", 10)['documents'] == ["docA"]
+
+
+def test_lru_eviction():
+    cache = make_cache(max_entries=2)
+    cache.store([1.0, 0.0], "v1", 10, ["a"], "a")
+    cache.store([0.0, 1.0], "v1", 10, ["b"], "b")
+    assert cache.lookup([1.0, 0.0], "v1", 10)['documents'] == ["a"] # "a" becomes most recently used
+    cache.store([-1.0, 0.0], "v1", 10, ["c"], "c")
+
+    assert cache.lookup([0.0, 1.0], "v1", 10) is None
+    assert cache.lookup([1.0, 0.0], "v1", 10)['documents'] == ["a"]
+    assert cache.stats()['evictions'] == 1 and cache.stats()['entries'] == 2
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("semantic_cache.time.time", lambda: now[0])
+    cache = make_cache(ttl_seconds=60)
+    cache.store(BASE, "v1", 10, ["docA"], "hydeA")
+
+    now[0] += 59
+    assert cache.lookup(BASE, "v1", 10) is not None
+    now[0] += 2
+    assert cache.lookup(BASE, "v1", 10) is None
+    assert cache.stats()['expirations'] == 1 and cache.stats()['entries'] == 0
+
+
+def test_save_load_round_trip(tmp_path):
+    path = str(tmp_path / "cache" / "semantic_cache.pkl")
+    cache = make_cache(persist_path=path)
+    cache.store(BASE, "v1", 10, ["docA"], "hydeA")
+    cache.store([0.0, 1.0], "v1", 10, ["docB"], "hydeB")
+    cache.save()
+
+    reloaded = make_cache(persist_path=path)
+    assert reloaded.stats()['entries'] == 2
+    assert reloaded.lookup(BASE, "v1", 10)['documents'] == ["docA"]
+    # New entries don't overwrite loaded ones.
+    reloaded.store([-1.0, 0.0], "v1", 10, ["docC"], "hydeC")
+    assert reloaded.lookup([0.0, 1.0], "v1", 10)['documents'] == ["docB"]
+    assert make_cache(persist_path=path, max_entries=1).stats()['entries'] == 1
+
+
+def test_from_config():
+    assert SemanticQueryCache.from_config({'semantic_cache': {'enabled': False}}) is None
+    cache = SemanticQueryCache.from_config({'semantic_cache': {'enabled': True, 'similarity_threshold': 0.9}, 'paths': {}})
+    assert cache.similarity_threshold == 0.9 and cache.hyde_threshold == 0.9
@@ -0,0 +1,99 @@
+"""Streaming: incremental response parsing and stream_row event order."""
+import threading
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.documents import Document
+
+from index_manager import IndexManager
+from rcm_engine import RcmAuditor, StreamingResponseParser
+
+# Tags split across chunk boundaries, as providers stream them.
+CHUNKS = [
+    "<verif", "ication_step>Policy approved [Page 1] -> Verified</verifi", "cation_step>\n<ans",
+    "wer>Yes, the policy is approved [Page 1].</an", "swer>\n\n**COMPLIANCE ", "VERDICT:** Compliant",
+]
+
+
+def feed_all(parser, chunks):
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    return events
+
+
+def test_parser_emits_each_section_once_across_split_tags():
+    parser = StreamingResponseParser()
+    events = feed_all(parser, CHUNKS)
+
+    assert events == [
+        ('verification_step', "Policy approved [Page 1] -> Verified"),
+        ('answer', "Yes, the policy is approved [Page 1]."),
+    ]
+    assert parser.close() == []
+    assert parser.buffer == "".join(CHUNKS)
+
+
+def test_parser_answer_is_emitted_when_its_section_closes():
+    parser = StreamingResponseParser()
+    assert feed_all(parser, CHUNKS[:4]) == [('verification_step', "Policy approved [Page 1] -> Verified")]
+    assert parser.feed(CHUNKS[4]) == [('answer', "Yes, the policy is approved [Page 1].")]
+    assert parser.feed(CHUNKS[5]) == []
+
+
+def test_close_falls_back_when_tags_are_missing():
+    parser = StreamingResponseParser()
+    assert feed_all(parser, ["The policy is ", "partially documented.\n", "**COMPLIANCE VERDICT:** Partial"]) == []
+    assert parser.close() == [('answer', "The policy is partially documented.")]
+    assert parser.close() == []
+
+    parser = StreamingResponseParser()
+    feed_all(parser, ["<verification_step>Checked", " page 2"])
+    # Same fallback as parse_response: without answer tags or verdict, the whole output is the answer.
+    assert parser.close() == [('verification_step', "Checked page 2"), ('answer', "<verification_step>Checked page 2")]
+
+
+class StreamingLLM:
+    """Streams CHUNKS; after the answer section closes, waits until the critique has been submitted."""
+
+    def __init__(self, critique_started):
+        self.critique_started = critique_started
+        self.critique_before_end = None
+
+    def stream(self, messages):
+        for i, chunk in enumerate(CHUNKS):
+            yield SimpleNamespace(content=chunk)
+            if i == 4: # "</answer>" is complete
+                self.critique_before_end = self.critique_started.wait(timeout=10)
+
+
+@pytest.fixture
+def auditor(fake_config):
+    return RcmAuditor(index_manager=IndexManager())
+
+
+def test_stream_row_overlaps_critique_with_generation(auditor):
+    critique_started = threading.Event()
+    critiqued = []
+
+    def critique_answer(context_text, query, final_answer):
+        critiqued.append(final_answer)
+        critique_started.set()
+        return {'score': 9, 'reasoning': "ok"}
+
+    auditor.llm = StreamingLLM(critique_started)
+    auditor.critique_answer = critique_answer
+    docs = [Document(page_content="The policy was approved by the board.", metadata={'page': 1})]
+    row = {'Control Reference': 'C-1', 'Design Effectiveness Assessment': 'Is the policy approved?'}
+
+    events = list(auditor.stream_row(row, retrieved_docs=docs))
+    kinds = [e['event'] for e in events]
+
+    assert kinds[0] == 'context' and events[0]['evidence'] == ["Page 1"]
+    assert kinds.count('token') == len(CHUNKS)
+    assert kinds.count('answer') == 1
+    assert kinds[-3:] == ['verdict', 'critique', 'result']
+    assert auditor.llm.critique_before_end is True
+    assert critiqued == ["Yes, the policy is approved [Page 1]."]
+    result = events[-1]['result']
+    assert result['Compliance_Verdict'] == "Compliant" and result['Validation_Score'] == 9